@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.benchmark import load_dataset_puzzles
+from src.reconstruction_v1 import (
+    compute_distance_matrices,
+    compute_edge_histograms,
+    edge_color_distance,
+    slice_edges_color,
+)
+from src.segmentation import segment_images
+
+dataset_root = "data/raw/Gravity Falls"
+grid_sizes = (2, 4, 8)
+limit = 5 # check only the first puzzles of each grid size
+tolerance = 1e-5
+
+
+def pairwise_distances(color_pieces):
+    """
+    Reference (horizontal, vertical) matrices from edge_color_distance
+    on every pair of strips, as the per-pair solver computed them.
+    """
+    strips = [slice_edges_color(img) for img in color_pieces]
+    n = len(strips)
+    horizontal = np.zeros((n, n))
+    vertical = np.zeros((n, n))
+
+    for i, (_, right_i, bottom_i, _) in enumerate(strips):
+        for j, (top_j, _, _, left_j) in enumerate(strips):
+            horizontal[i, j] = edge_color_distance(right_i, left_j, "vertical")
+            vertical[i, j] = edge_color_distance(bottom_i, top_j, "horizontal")
+
+    return horizontal, vertical
+
+
+if __name__ == "__main__":
+    worst = 0.0
+
+    for grid_size in grid_sizes:
+        for name, img in load_dataset_puzzles(dataset_root, grid_size, limit):
+            _, (color_pieces,) = segment_images([img], grid_size)
+
+            matrices = compute_distance_matrices(compute_edge_histograms(color_pieces))
+            reference = pairwise_distances(color_pieces)
+
+            for label, got, expected in zip(("horizontal", "vertical"), matrices, reference):
+                error = float(np.max(np.abs(got - expected)))
+                worst = max(worst, error)
+                assert error <= tolerance, (
+                    f"{grid_size}x{grid_size}/{name} {label}: max error {error:.3g}"
+                )
+
+    print(f"compute_distance_matrices matches edge_color_distance (max error {worst:.3g})")
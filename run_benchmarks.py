@@ -0,0 +1,42 @@
+import os
+import sys
+
+from src.benchmark import (
+    REGRESSION_TOLERANCE,
+    compare_to_baseline,
+    load_baseline,
+    print_benchmark_table,
+    run_benchmarks,
+    save_baseline,
+)
+from src.paths import BENCHMARK_BASELINE
+
+dataset_root = "data/raw/Gravity Falls"
+puzzles_per_grid = 20 # bundled 2x2 / 4x4 / 8x8 puzzles per case
+synthetic_puzzles = 5 # 16x16 / 32x32 puzzles cut from the correct images
+repeat = 3
+save_as_baseline = False # overwrite the stored baseline with this run
+tolerance = REGRESSION_TOLERANCE
+
+if __name__ == "__main__":
+    results = run_benchmarks(dataset_root, puzzles_per_grid, synthetic_puzzles, repeat)
+
+    baseline = None
+    if os.path.exists(BENCHMARK_BASELINE) and not save_as_baseline:
+        baseline = load_baseline(BENCHMARK_BASELINE)
+
+    print_benchmark_table(results, baseline)
+
+    if baseline is None:
+        save_baseline(results, BENCHMARK_BASELINE)
+        print(f"\nSaved baseline: {BENCHMARK_BASELINE}")
+        sys.exit(0)
+
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    if regressions:
+        print(f"\nPERFORMANCE REGRESSIONS (tolerance {tolerance:.0%}):")
+        for name, metric, before, after in regressions:
+            print(f"  {name:<16} {metric:<12} {before:.2f} -> {after:.2f}")
+        sys.exit(1)
+
+    print("\nNo regressions against baseline.")
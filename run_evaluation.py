@@ -0,0 +1,16 @@
+from src.evaluation import evaluate_dataset, print_reconstruction_table
+from src.pipeline import SOLVERS
+
+dataset_root = "data/raw/Gravity Falls"
+grid_sizes = (2, 4, 8)
+solvers = ("v1", "v2", "beam")
+limit = None # evaluate only the first puzzles of each grid size
+
+if __name__ == "__main__":
+    results = [
+        evaluate_dataset(dataset_root, grid_size, SOLVERS[solver], limit)
+        for grid_size in grid_sizes
+        for solver in solvers
+    ]
+
+    print_reconstruction_table(results)
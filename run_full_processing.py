@@ -1,10 +1,36 @@
-from src.pipeline import process_dataset, print_accuracy_table
+import os
+
+from src.instrumentation import Stats
+from src.pipeline import ARTIFACTS_FULL, process_dataset, print_accuracy_table
 
 auto_size_detection = False
+workers = None # None = all cores, 1 = serial
+artifacts = ARTIFACTS_FULL # ARTIFACTS_NONE / ARTIFACTS_PIECES / ARTIFACTS_FULL
+packed_pieces = False # one .npy per puzzle instead of one PNG per piece
+stats_dir = None # e.g. "data/stats": per-stage timings as JSON + CSV per dataset
+
+if __name__ == "__main__":
+    results = []
+
+    for dataset in (
+        "data/raw/Gravity Falls/puzzle_2x2",
+        "data/raw/Gravity Falls/puzzle_4x4",
+        "data/raw/Gravity Falls/puzzle_8x8",
+    ):
+        name = os.path.basename(dataset)
+        timings = Stats(name) if stats_dir else None
+
+        stats = process_dataset(
+            dataset, auto_size_detection, workers,
+            artifacts=artifacts, packed=packed_pieces, stats=timings,
+        )
+        if stats is not None:
+            results.append(stats)
 
-process_dataset("data/raw/Gravity Falls/puzzle_2x2", auto_size_detection)
-process_dataset("data/raw/Gravity Falls/puzzle_4x4", auto_size_detection)
-process_dataset("data/raw/Gravity Falls/puzzle_8x8", auto_size_detection)
+        if timings is not None:
+            os.makedirs(stats_dir, exist_ok=True)
+            timings.to_json(os.path.join(stats_dir, f"{name}.json"))
+            timings.to_csv(os.path.join(stats_dir, f"{name}.csv"))
 
-if auto_size_detection:
-    print_accuracy_table()
\ No newline at end of file
+    if auto_size_detection:
+        print_accuracy_table(results)
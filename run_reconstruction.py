@@ -1,50 +1,37 @@
 import os
-import cv2
-from pathlib import Path
 
-from src.paths import COLORED_PIECES_DIR, RECONSTRUCTED_DIR
-
-from src.reconstruction_v1 import start_reconstruction_v1
-from src.reconstruction_v2 import start_reconstruction_v2
+from src.instrumentation import Stats
+from src.paths import (
+    COLORED_PIECES_DIR,
+    FEATURE_CACHE_DIR,
+    PACKED_PIECES_DIR,
+    RECONSTRUCTED_DIR,
+)
+from src.pipeline import reconstruct_dataset
 
 RECONSTRUCTED_V2 = True
-
-os.makedirs(RECONSTRUCTED_DIR, exist_ok=True)
-
-for grid in os.listdir(COLORED_PIECES_DIR):
-    grid_path = Path(COLORED_PIECES_DIR) / grid
-    if not grid_path.is_dir():
-        continue
-
-    N = int(grid.split("x")[0])
-
-    for puzzle_dir in grid_path.iterdir():
-        if not puzzle_dir.is_dir():
-            continue
-
-        print(f"Reconstructing {grid}/{puzzle_dir.name}")
-
-        # Load pieces
-        color_pieces = []
-        for img_path in sorted(puzzle_dir.glob("*.png")):
-            img = cv2.imread(str(img_path), cv2.IMREAD_COLOR)
-            if img is not None:
-                color_pieces.append(img)
-
-        if len(color_pieces) != N * N:
-            print(f"Skipping (expected {N*N}, got {len(color_pieces)})")
-            continue
-        
-        # Reconstruct
-        if RECONSTRUCTED_V2:
-            assembled = start_reconstruction_v2(color_pieces, N)
-        else:
-            assembled = start_reconstruction_v1(color_pieces, N)
-
-        # Save result
-        out = Path(RECONSTRUCTED_DIR) / grid
-        out.mkdir(parents=True, exist_ok=True)
-        out_path = out / f"{puzzle_dir.name}.png"
-
-        cv2.imwrite(str(out_path), assembled) # type: ignore
-        print("Saved:", out_path)
+PACKED_PIECES = False # read pieces written with packed_pieces = True
+workers = None # None = all cores, 1 = serial
+STATS_DIR = None # e.g. "data/stats": per-stage timings as JSON + CSV
+FEATURE_CACHE = False # reuse edge features across runs (pays off for v1; v2 recomputes faster)
+BATCH_SIZE = None # e.g. 64: solve v2 puzzles in batches (faster on small grids, no feature cache)
+
+if __name__ == "__main__":
+    os.makedirs(RECONSTRUCTED_DIR, exist_ok=True)
+
+    solver = "v2" if RECONSTRUCTED_V2 else "v1"
+    timings = Stats(f"reconstruction_{solver}") if STATS_DIR else None
+
+    reconstruct_dataset(
+        PACKED_PIECES_DIR if PACKED_PIECES else COLORED_PIECES_DIR,
+        solver=solver,
+        workers=workers,
+        stats=timings,
+        feature_cache_dir=FEATURE_CACHE_DIR if FEATURE_CACHE else None,
+        batch_size=BATCH_SIZE if RECONSTRUCTED_V2 else None,
+    )
+
+    if timings is not None:
+        os.makedirs(STATS_DIR, exist_ok=True)
+        timings.to_json(os.path.join(STATS_DIR, f"{timings.name}.json"))
+        timings.to_csv(os.path.join(STATS_DIR, f"{timings.name}.csv"))
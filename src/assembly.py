@@ -0,0 +1,65 @@
+import threading
+
+import numpy as np
+
+from src.instrumentation import timed
+
+# Reusable canvases, one set per thread, keyed by (shape, dtype)
+_canvas_local = threading.local()
+
+
+def canvas_shape(pieces, placement):
+    """
+    Shape of the image assembled from pieces laid out as placement.
+    """
+    rows, cols = np.shape(placement)
+    piece_h, piece_w = pieces[0].shape[:2]
+    return (rows * piece_h, cols * piece_w) + pieces[0].shape[2:]
+
+
+def reusable_canvas(shape, dtype=np.uint8):
+    """
+    A per-thread buffer of the given shape, handed out again on the next
+    call with the same shape. Only for callers that are done with the
+    previous canvas (e.g. it has already been written to disk).
+    """
+    buffers = getattr(_canvas_local, "buffers", None)
+    if buffers is None:
+        buffers = _canvas_local.buffers = {}
+
+    key = (tuple(shape), np.dtype(dtype))
+    canvas = buffers.get(key)
+    if canvas is None:
+        canvas = buffers[key] = np.empty(shape, dtype)
+    return canvas
+
+
+def assemble_pieces(pieces, placement, out=None):
+    """
+    Paste pieces into one image following placement, a (rows, cols)
+    array of piece indices (-1 marks an empty cell, left black).
+
+    Writes into out when given (shape must match canvas_shape), otherwise
+    allocates the canvas. Returns the canvas.
+    """
+    placement = np.asarray(placement)
+    shape = canvas_shape(pieces, placement)
+
+    if out is None:
+        out = np.empty(shape, pieces[0].dtype)
+    elif out.shape != shape:
+        raise ValueError(f"Output buffer has shape {out.shape}, expected {shape}")
+
+    piece_h, piece_w = pieces[0].shape[:2]
+
+    with timed("assembly"):
+        for row, col in np.ndindex(*placement.shape):
+            cell = out[row * piece_h:(row + 1) * piece_h, col * piece_w:(col + 1) * piece_w]
+            idx = int(placement[row, col])
+
+            if idx < 0:
+                cell[...] = 0
+            else:
+                cell[...] = pieces[idx]
+
+    return out
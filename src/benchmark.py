@@ -0,0 +1,235 @@
+import json
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from src.edge_detection import canny_edges_tiles
+from src.enhancement import EnhancedImage
+from src.instrumentation import Stats, collect
+from src.reconstruction_v1 import solve_v1
+from src.reconstruction_v2 import solve_v2
+from src.reconstruction_beam import solve_beam
+from src.segmentation import segment_images
+from src.size_detection import detect_grid_size_fast
+from src.thresholding import threshold_adaptive_tiles
+
+# Placement solvers; canvas assembly is not part of the solve
+BENCH_SOLVERS = {
+    "v1": solve_v1,
+    "v2": solve_v2,
+    "beam": solve_beam,
+}
+
+DATASET_GRIDS = (2, 4, 8)
+SYNTHETIC_GRIDS = (16, 32)
+
+# Allowed slowdown / growth relative to the baseline before a case fails
+REGRESSION_TOLERANCE = 0.25
+
+
+# PUZZLE SETS
+def _image_paths(folder, limit):
+    names = sorted(os.listdir(folder), key=lambda f: (len(f), f))
+    return [os.path.join(folder, name) for name in names[:limit]]
+
+
+def load_dataset_puzzles(dataset_root, grid_size, limit):
+    """
+    First limit puzzles of <dataset_root>/puzzle_<N>x<N>, as
+    (name, image) pairs in a fixed order.
+    """
+    folder = os.path.join(dataset_root, f"puzzle_{grid_size}x{grid_size}")
+    return [
+        (os.path.basename(path), cv2.imread(path))
+        for path in _image_paths(folder, limit)
+    ]
+
+
+def make_synthetic_puzzle(img, grid_size, rng):
+    """
+    Cut img into grid_size x grid_size tiles and shuffle them.
+    Returns the shuffled tiles (copies, so solvers see no shared memory).
+    """
+    _, (tiles,) = segment_images([img], grid_size)
+    order = rng.permutation(len(tiles))
+    return [tiles[i].copy() for i in order]
+
+
+def load_synthetic_puzzles(dataset_root, grid_size, limit, seed=0):
+    """
+    Larger grids cut from the correct images, with a fixed shuffle seed
+    so every run benchmarks the same puzzles.
+    """
+    rng = np.random.default_rng(seed)
+    folder = os.path.join(dataset_root, "correct")
+    return [
+        (os.path.basename(path), make_synthetic_puzzle(cv2.imread(path), grid_size, rng))
+        for path in _image_paths(folder, limit)
+    ]
+
+
+# CASES
+def _preprocess(img, grid_size):
+    enhancement = EnhancedImage(img)
+    detect_grid_size_fast(enhancement.sharp, lambda: enhancement.sharp_clahe)
+
+    piece_metadata, _ = segment_images([img, enhancement.sharp_clahe], grid_size)
+    threshold_adaptive_tiles(enhancement.sharp_clahe, piece_metadata)
+    canny_edges_tiles(enhancement.sharp_clahe, piece_metadata)
+
+
+def build_cases(dataset_root, limit, synthetic_limit, solvers=BENCH_SOLVERS):
+    """
+    Benchmark cases as {case name: (func, [args tuples])}:
+      preprocess/<N>x<N>  enhancement, detection, segmentation, threshold/edges
+      <solver>/<N>x<N>    one solver on the pieces of each puzzle
+    Grids 2/4/8 come from the dataset, 16/32 are synthetic.
+    """
+    cases = {}
+
+    for grid_size in DATASET_GRIDS:
+        puzzles = load_dataset_puzzles(dataset_root, grid_size, limit)
+        grid = f"{grid_size}x{grid_size}"
+
+        cases[f"preprocess/{grid}"] = (
+            _preprocess, [(img, grid_size) for _, img in puzzles]
+        )
+
+        pieces = [segment_images([img], grid_size)[1][0] for _, img in puzzles]
+        for solver, func in solvers.items():
+            cases[f"{solver}/{grid}"] = (func, [(p, grid_size) for p in pieces])
+
+    for grid_size in SYNTHETIC_GRIDS:
+        puzzles = load_synthetic_puzzles(dataset_root, grid_size, synthetic_limit)
+        grid = f"{grid_size}x{grid_size}"
+
+        for solver, func in solvers.items():
+            cases[f"{solver}/{grid}"] = (func, [(p, grid_size) for _, p in puzzles])
+
+    return cases
+
+
+# MEASUREMENT
+def _peak_memory(func, args_list):
+    """
+    Peak traced allocation (bytes) of a single call, worst over args_list.
+    Counts NumPy buffers; OpenCV's internal allocations are not traced.
+    """
+    peak = 0
+    for args in args_list:
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return peak
+
+
+def run_case(func, args_list, repeat=1, warmup=1, memory_samples=3):
+    """
+    Time func over every args tuple (repeat passes, after warmup calls).
+    Returns throughput, latency percentiles, peak memory and the stage
+    timings collected through src.instrumentation.
+    """
+    for args in args_list[:warmup]:
+        func(*args)
+
+    latencies = []
+    stats = Stats()
+    with collect(stats):
+        for _ in range(repeat):
+            for args in args_list:
+                start = time.perf_counter()
+                func(*args)
+                latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies)
+    total = float(latencies.sum())
+
+    return {
+        "puzzles": len(latencies),
+        "throughput": len(latencies) / total if total > 0 else float("inf"),
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "peak_mem_mb": _peak_memory(func, args_list[:memory_samples]) / 2**20,
+        "stages_ms": {
+            stage: entry["seconds"] / len(latencies) * 1000
+            for stage, entry in stats.to_dict()["timings"].items()
+        },
+    }
+
+
+def run_benchmarks(dataset_root, limit=20, synthetic_limit=5, repeat=1, cases=None):
+    """
+    Run every case of build_cases (or only the names in cases).
+    Returns {case name: run_case result}.
+    """
+    all_cases = build_cases(dataset_root, limit, synthetic_limit)
+    if cases is not None:
+        all_cases = {name: all_cases[name] for name in cases}
+
+    results = {}
+    for name, (func, args_list) in all_cases.items():
+        print(f"Benchmarking {name} ({len(args_list)} puzzles)")
+        results[name] = run_case(func, args_list, repeat)
+
+    return results
+
+
+# BASELINE
+def save_baseline(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Cases slower (p50 / p95 latency, throughput) or heavier (peak memory)
+    than baseline by more than tolerance.
+    Returns a list of (case, metric, baseline value, current value).
+    """
+    regressions = []
+
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+
+        for metric in ("p50_ms", "p95_ms", "peak_mem_mb"):
+            if current[metric] > reference[metric] * (1 + tolerance):
+                regressions.append((name, metric, reference[metric], current[metric]))
+
+        if current["throughput"] * (1 + tolerance) < reference["throughput"]:
+            regressions.append(
+                (name, "throughput", reference["throughput"], current["throughput"])
+            )
+
+    return regressions
+
+
+def print_benchmark_table(results, baseline=None):
+    print("\nBenchmark Results:\n")
+    print("{:<16} {:>8} {:>12} {:>10} {:>10} {:>10} {:>9}".format(
+        "Case", "Puzzles", "Puzzles/s", "p50 ms", "p95 ms", "Peak MB", "vs base"
+    ))
+    print("-" * 80)
+
+    for name, r in results.items():
+        change = ""
+        if baseline is not None and name in baseline:
+            change = f"{r['p50_ms'] / baseline[name]['p50_ms'] - 1:+.0%}"
+
+        print("{:<16} {:>8} {:>12.1f} {:>10.2f} {:>10.2f} {:>10.2f} {:>9}".format(
+            name, r["puzzles"], r["throughput"], r["p50_ms"], r["p95_ms"],
+            r["peak_mem_mb"], change
+        ))
@@ -1,7 +1,16 @@
 import cv2
 import numpy as np
+import threading
+
+from src.instrumentation import timed
+
+# One CLAHE object per thread: instances keep scratch buffers and are
+# not safe to share between threads
+_clahe_local = threading.local()
 
 def to_grayscale(img):
+    if len(img.shape) == 2:
+        return img
     return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
 def denoise_gaussian(gray):
@@ -13,9 +22,15 @@ sigmaColor = 25,
 sigmaSpace = 10
 )
 
+def _clahe():
+    clahe = getattr(_clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=1.0, tileGridSize=(10,10))
+        _clahe_local.clahe = clahe
+    return clahe
+
 def apply_clahe(gray):
-    clahe = cv2.createCLAHE(clipLimit=1.0, tileGridSize=(10,10))
-    return clahe.apply(gray)
+    return _clahe().apply(gray)
 
 def sharpen(img):
     blur = cv2.GaussianBlur(img, (0,0), sigmaX=1.0)
@@ -28,13 +43,55 @@ def morphology(img):
         opened = cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel, iterations=1)
     return opened
 
-def enhance_image(img):  
-    gray = to_grayscale(img)
-    denoised = denoise_bilateral(gray)
-    
-    clahe_img = apply_clahe(denoised)
-    sharp_img_clahe = sharpen(clahe_img)
+class EnhancedImage:
+    """
+    Enhancement products computed on first access and cached:
+    gray -> denoised (bilateral) -> sharp / sharp_clahe.
+    Callers that never touch a product never pay for it, e.g. a
+    reconstruction with a known grid size skips enhancement entirely.
+    """
+
+    __slots__ = ("_img", "_gray", "_denoised", "_sharp", "_sharp_clahe")
+
+    def __init__(self, img):
+        self._img = img
+        self._gray = None
+        self._denoised = None
+        self._sharp = None
+        self._sharp_clahe = None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            with timed("enhancement.grayscale"):
+                self._gray = to_grayscale(self._img)
+        return self._gray
+
+    @property
+    def denoised(self):
+        if self._denoised is None:
+            gray = self.gray
+            with timed("enhancement.denoise"):
+                self._denoised = denoise_bilateral(gray)
+        return self._denoised
+
+    @property
+    def sharp(self):
+        if self._sharp is None:
+            denoised = self.denoised
+            with timed("enhancement.sharpen"):
+                self._sharp = sharpen(denoised)
+        return self._sharp
+
+    @property
+    def sharp_clahe(self):
+        if self._sharp_clahe is None:
+            denoised = self.denoised
+            with timed("enhancement.clahe"):
+                self._sharp_clahe = sharpen(apply_clahe(denoised))
+        return self._sharp_clahe
 
-    sharp_img = sharpen(denoised)
 
-    return sharp_img, sharp_img_clahe
+def enhance_image(img):
+    enhanced = EnhancedImage(img)
+    return enhanced.sharp, enhanced.sharp_clahe
@@ -0,0 +1,201 @@
+import os
+
+import cv2
+import numpy as np
+
+from src.segmentation import segment_images
+
+# Side of the per-tile thumbnails used to identify a puzzle's source image
+THUMB_SIZE = 8
+
+
+# GROUND TRUTH
+def _tile_matrix(img, grid_size):
+    """
+    Tiles of img in row-major order, flattened to float64 rows (N*N, D).
+    """
+    tile_h, tile_w = img.shape[0] // grid_size, img.shape[1] // grid_size
+    tiles = img[:grid_size * tile_h, :grid_size * tile_w].reshape(
+        grid_size, tile_h, grid_size, tile_w, -1
+    )
+    return tiles.transpose(0, 2, 1, 3, 4).reshape(grid_size * grid_size, -1).astype(np.float64)
+
+
+def _tile_thumbnails(img, grid_size):
+    """
+    Every tile shrunk to THUMB_SIZE x THUMB_SIZE with one resize call.
+    """
+    side = grid_size * THUMB_SIZE
+    return _tile_matrix(cv2.resize(img, (side, side), interpolation=cv2.INTER_AREA), grid_size)
+
+
+def _squared_distances(a, b):
+    """
+    Squared euclidean distances between the rows of a (..., n, D) and
+    b (..., m, D), as (..., n, m).
+    """
+    return (
+        (a * a).sum(-1)[..., :, None]
+        + (b * b).sum(-1)[..., None, :]
+        - 2 * a @ np.swapaxes(b, -1, -2)
+    )
+
+
+def _assign(cost):
+    """
+    Row -> column assignment minimizing each row's cost. Rows that
+    compete for the same column (e.g. identical flat tiles) are resolved
+    greedily, cheapest pairs first, so the result is a permutation.
+    """
+    assignment = cost.argmin(axis=1)
+    if len(np.unique(assignment)) == len(assignment):
+        return assignment
+
+    assignment = np.full(len(cost), -1)
+    taken = np.zeros(cost.shape[1], bool)
+
+    rows, cols = np.unravel_index(np.argsort(cost, axis=None, kind="stable"), cost.shape)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if assignment[row] < 0 and not taken[col]:
+            assignment[row] = col
+            taken[col] = True
+
+    return assignment
+
+
+def correct_thumbnails(correct_images, grid_size):
+    """
+    Tile thumbnails of every reference image, (M, N*N, D). Compute once
+    per dataset and pass to ground_truth.
+    """
+    return np.stack([_tile_thumbnails(img, grid_size) for img in correct_images])
+
+
+def ground_truth(puzzle_img, correct_images, grid_size, thumbnails=None):
+    """
+    Identify which correct image a shuffled puzzle was cut from and
+    where each of its pieces belongs.
+
+    Pieces are indexed row-major as segment_images returns them.
+    Returns (correct image index, truth) where truth[piece] is the
+    piece's row-major position in the solved puzzle.
+    """
+    if thumbnails is None:
+        thumbnails = correct_thumbnails(correct_images, grid_size)
+
+    # Source image: smallest summed nearest-tile distance, on thumbnails
+    puzzle_thumbs = _tile_thumbnails(puzzle_img, grid_size)
+    scores = _squared_distances(puzzle_thumbs[None], thumbnails).min(axis=2).sum(axis=1)
+    source = int(np.argmin(scores))
+
+    # Piece positions: full-resolution tile distances
+    cost = _squared_distances(
+        _tile_matrix(puzzle_img, grid_size),
+        _tile_matrix(correct_images[source], grid_size),
+    )
+    return source, _assign(cost)
+
+
+# METRICS
+def evaluate_placements(placements, truths):
+    """
+    Vectorized accuracy of many same-size solutions.
+
+    placements: (B, N, N) piece index per grid cell (or one (N, N)).
+    truths:     (B, N*N) true row-major position per piece (or one (N*N,)).
+
+    Returns per-puzzle arrays (B,):
+      direct:   fraction of pieces in their true cell
+      neighbor: fraction of adjacent cell pairs that are true neighbors
+                in the same relative position
+      perfect:  every piece placed correctly
+    """
+    placements = np.asarray(placements)
+    truths = np.asarray(truths)
+    if placements.ndim == 2:
+        placements, truths = placements[None], truths[None]
+
+    batch, grid_size, _ = placements.shape
+
+    # True position of the piece placed in every cell
+    positions = np.take_along_axis(
+        truths, placements.reshape(batch, -1), axis=1
+    ).reshape(batch, grid_size, grid_size)
+
+    cells = np.arange(grid_size * grid_size).reshape(grid_size, grid_size)
+    direct = (positions == cells).mean(axis=(1, 2))
+
+    left, right = positions[:, :, :-1], positions[:, :, 1:]
+    horizontal = (right == left + 1) & (left % grid_size != grid_size - 1)
+    vertical = positions[:, 1:, :] == positions[:, :-1, :] + grid_size
+
+    pairs = 2 * grid_size * (grid_size - 1)
+    neighbor = (horizontal.sum(axis=(1, 2)) + vertical.sum(axis=(1, 2))) / pairs
+
+    return {
+        "direct": direct,
+        "neighbor": neighbor,
+        "perfect": direct == 1.0,
+    }
+
+
+# DATASET
+def _sorted_images(folder, limit=None):
+    names = sorted(os.listdir(folder), key=lambda f: (len(f), f))[:limit]
+    return names, [cv2.imread(os.path.join(folder, name)) for name in names]
+
+
+def load_ground_truth(dataset_root, grid_size, limit=None):
+    """
+    Puzzles of <dataset_root>/puzzle_<N>x<N> with their ground truth.
+    Returns (names, puzzle images, truths (B, N*N)).
+    """
+    _, correct_images = _sorted_images(os.path.join(dataset_root, "correct"))
+    thumbnails = correct_thumbnails(correct_images, grid_size)
+
+    names, puzzles = _sorted_images(
+        os.path.join(dataset_root, f"puzzle_{grid_size}x{grid_size}"), limit
+    )
+    truths = np.stack([
+        ground_truth(img, correct_images, grid_size, thumbnails)[1] for img in puzzles
+    ])
+    return names, puzzles, truths
+
+
+def evaluate_dataset(dataset_root, grid_size, solver, limit=None):
+    """
+    Solve every puzzle of one grid size with solver (a placement solver
+    such as solve_v2) and score it against ground truth.
+    Returns a summary dict plus the per-puzzle metric arrays.
+    """
+    names, puzzles, truths = load_ground_truth(dataset_root, grid_size, limit)
+
+    placements = []
+    for img in puzzles:
+        _, (pieces,) = segment_images([img], grid_size)
+        placements.append(solver(pieces, grid_size))
+
+    metrics = evaluate_placements(np.stack(placements), truths)
+
+    return {
+        "dataset": f"{grid_size}x{grid_size}",
+        "solver": getattr(solver, "__name__", str(solver)),
+        "puzzles": len(names),
+        "direct": float(metrics["direct"].mean() * 100),
+        "neighbor": float(metrics["neighbor"].mean() * 100),
+        "perfect": int(metrics["perfect"].sum()),
+        "per_puzzle": dict(zip(names, metrics["direct"].tolist())),
+    }
+
+
+def print_reconstruction_table(results):
+    print("\nReconstruction Accuracy:\n")
+    print("{:<10} {:<26} {:<8} {:<10} {:<10} {:<8}".format(
+        "Dataset", "Solver", "Puzzles", "Direct %", "Neighbor %", "Perfect"
+    ))
+    print("-" * 76)
+
+    for r in results:
+        print("{:<10} {:<26} {:<8} {:<10.2f} {:<10.2f} {:<8}".format(
+            r["dataset"], r["solver"], r["puzzles"], r["direct"], r["neighbor"], r["perfect"]
+        ))
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from src.instrumentation import count, timed
+
+FEATURE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _border_strips(piece, border):
+    """
+    The outer border rows / columns of a piece (everything when the
+    piece is too small to have an interior).
+    """
+    if 2 * border >= min(piece.shape[:2]):
+        return (piece,)
+    return piece[:border], piece[-border:], piece[:, :border], piece[:, -border:]
+
+
+def feature_key(pieces, params, border=None):
+    """
+    Content address of a puzzle's features: a hash of every piece's
+    pixels (in order, with shape and dtype) and the feature parameters.
+
+    With border, only each piece's outer border pixels are hashed, for
+    features that never look further inside: hashing whole tiles can
+    cost more than recomputing edge features.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(f"border={border}".encode())
+
+    for piece in pieces:
+        digest.update(f"{piece.shape}{piece.dtype}".encode())
+
+        strips = (piece,) if border is None else _border_strips(piece, border)
+        for strip in strips:
+            digest.update(np.ascontiguousarray(strip).data)
+
+    return digest.hexdigest()
+
+
+# Entry layout: 8-byte header length, JSON header, then every array's
+# data at 64-byte aligned offsets. One file and one mmap per entry.
+_HEADER_LENGTH = struct.Struct("<Q")
+_ALIGN = 64
+
+
+def _aligned(nbytes):
+    return -(-nbytes // _ALIGN) * _ALIGN
+
+
+def _write_entry(path, arrays):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    header, offset = {}, 0
+    for name, array in arrays.items():
+        header[name] = {"dtype": array.dtype.str, "shape": array.shape, "offset": offset}
+        offset += _aligned(array.nbytes)
+
+    header_bytes = json.dumps(header).encode()
+    data_start = _aligned(_HEADER_LENGTH.size + len(header_bytes))
+
+    with open(path, "wb") as f:
+        f.write(_HEADER_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header[name]["offset"])
+            f.write(array.data)
+        f.truncate(data_start + offset)
+
+
+def _read_entry(path):
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    header_length = _HEADER_LENGTH.unpack(data[:_HEADER_LENGTH.size].tobytes())[0]
+    header_end = _HEADER_LENGTH.size + header_length
+    header = json.loads(data[_HEADER_LENGTH.size:header_end].tobytes())
+    if not isinstance(header, dict):
+        raise ValueError(f"Not a feature cache entry: {path}")
+    data_start = _aligned(header_end)
+
+    arrays = {}
+    for name, info in header.items():
+        dtype = np.dtype(info["dtype"])
+        start = data_start + info["offset"]
+        size = int(np.prod(info["shape"], dtype=np.int64))
+        arrays[name] = data[start:start + size * dtype.itemsize].view(dtype).reshape(info["shape"])
+
+    return arrays
+
+
+class FeatureCache:
+    """
+    On-disk cache of per-puzzle feature arrays, one file per key.
+    Entries are read memory-mapped, written atomically (safe to share
+    between worker processes) and evicted least recently used first
+    once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root, max_bytes=FEATURE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, f"{key}.feat")
+
+    def get(self, key):
+        """
+        Cached arrays for key as a dict of read-only memmaps, or None.
+        A truncated or foreign entry is deleted and reads as a miss.
+        """
+        path = self._entry_path(key)
+
+        try:
+            arrays = _read_entry(path)
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            return None
+        except (struct.error, ValueError, KeyError, TypeError):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+        return arrays
+
+    def put(self, key, arrays):
+        """
+        Store a dict of arrays under key, then evict down to max_bytes.
+        """
+        fd, staging = tempfile.mkstemp(prefix=".tmp-", dir=self.root)
+        os.close(fd)
+        try:
+            _write_entry(staging, arrays)
+            os.replace(staging, self._entry_path(key))
+        except BaseException:
+            os.remove(staging)
+            raise
+
+        self.evict()
+
+    def get_or_compute(self, pieces, params, compute, border=None):
+        """
+        Features of pieces from the cache, or compute(pieces) (a dict
+        of arrays) stored for the next run. border is passed on to
+        feature_key.
+        """
+        key = feature_key(pieces, params, border)
+
+        with timed("feature_cache.load"):
+            arrays = self.get(key)
+
+        if arrays is not None:
+            count("feature_cache.hits")
+            return arrays
+
+        count("feature_cache.misses")
+        arrays = compute(pieces)
+        self.put(key, arrays)
+        return arrays
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".feat"):
+                continue
+
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue # evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits max_bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def cached_features(cache, pieces, params, compute, border=None):
+    """
+    compute(pieces) through cache, or directly when cache is None.
+    border: pixels from each side that compute depends on (see feature_key).
+    """
+    if cache is None:
+        return compute(pieces)
+    return cache.get_or_compute(pieces, params, compute, border)
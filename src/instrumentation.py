@@ -0,0 +1,149 @@
+import contextvars
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Stats collector of the current context; None means instrumentation is off
+_active_stats = contextvars.ContextVar("active_stats", default=None)
+
+
+class Stats:
+    """
+    Accumulates per-stage wall-clock timings (total seconds and number
+    of calls) and event counters. Safe to update from several threads.
+
+    records holds optional per-item breakdowns (e.g. one per image) so a
+    dataset-level Stats can be exported together with its images.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.timings = {}
+        self.counters = {}
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            total, count = self.timings.get(stage, (0.0, 0))
+            self.timings[stage] = (total + seconds, count + calls)
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def merge(self, other):
+        """
+        Add another Stats (or its to_dict() form) into this one.
+        """
+        if isinstance(other, Stats):
+            other = other.to_dict()
+
+        for stage, entry in other["timings"].items():
+            self.add_time(stage, entry["seconds"], entry["calls"])
+        for counter, n in other["counters"].items():
+            self.count(counter, n)
+
+    def add_record(self, stats):
+        """
+        Keep stats as a per-item record and add it to the totals.
+        """
+        if isinstance(stats, Stats):
+            stats = stats.to_dict()
+
+        self.merge(stats)
+        with self._lock:
+            self.records.append(stats)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "timings": {
+                    stage: {"seconds": total, "calls": calls}
+                    for stage, (total, calls) in sorted(self.timings.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+                "records": list(self.records),
+            }
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def to_csv(self, path):
+        """
+        One row per record plus a final row for the totals; columns are
+        <stage>_s (seconds) and counter names.
+        """
+        rows = [_flat_row(record) for record in self.to_dict()["records"]]
+        rows.append(_flat_row(self.to_dict()))
+
+        columns = ["name"] + sorted({key for row in rows for key in row} - {"name"})
+
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def _flat_row(stats_dict):
+    row = {"name": stats_dict["name"]}
+    for stage, entry in stats_dict["timings"].items():
+        row[f"{stage}_s"] = entry["seconds"]
+    row.update(stats_dict["counters"])
+    return row
+
+
+@contextmanager
+def collect(stats=None):
+    """
+    Route timed() / count() calls made in this context to stats
+    (a fresh Stats if None), which is yielded.
+    """
+    stats = Stats() if stats is None else stats
+    token = _active_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+def active_stats():
+    return _active_stats.get()
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block into the active Stats; a no-op when none is active.
+    """
+    stats = _active_stats.get()
+    if stats is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(stage, time.perf_counter() - start)
+
+
+def count(counter, n=1):
+    stats = _active_stats.get()
+    if stats is not None:
+        stats.count(counter, n)
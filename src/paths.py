@@ -3,7 +3,11 @@ CONTOURS_DIR = "data/contours"
 
 ENHANCED_PIECES_DIR = "data/enhanced_pieces"
 COLORED_PIECES_DIR = "data/colored_pieces"
+PACKED_PIECES_DIR = "data/packed_pieces"
 BINARY_PIECES_DIR = "data/binary_pieces"
 EDGE_PIECES_DIR = "data/edge_pieces"
 
-RECONSTRUCTED_DIR = "data/reconstructed"
\ No newline at end of file
+RECONSTRUCTED_DIR = "data/reconstructed"
+FEATURE_CACHE_DIR = "data/feature_cache"
+
+BENCHMARK_BASELINE = "data/benchmarks/baseline.json"
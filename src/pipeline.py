@@ -1,116 +1,333 @@
 import os
 import cv2
+import numpy as np
+from pathlib import Path
 
-from src.edge_detection import canny_edges
-from src.enhancement import enhance_image
-from src.utils import save_image
-from src.size_detection import detect_grid_size
-from src.segmentation import segment_and_extract
-from src.thresholding import threshold_adaptive
+from src.assembly import assemble_pieces, canvas_shape, reusable_canvas
+from src.edge_detection import canny_edges_tiles
+from src.enhancement import EnhancedImage
+from src.feature_cache import FeatureCache
+from src.instrumentation import Stats, collect, count, timed
+from src.utils import (
+    ArtifactWriter,
+    load_packed_pieces,
+    detection_reduce,
+    read_detection_image,
+    save_image,
+    save_packed_pieces,
+)
+from src.runner import run_tasks
+from src.size_detection import DETECTION_MAX_SIDE, detect_grid_shape, detect_grid_size_fast
+from src.segmentation import draw_grid_contours, segment_images
+from src.thresholding import threshold_adaptive_tiles
+from src.reconstruction_v1 import solve_v1
+from src.reconstruction_v2 import solve_v2, solve_v2_batch
+from src.reconstruction_beam import solve_beam
 from src.paths import (
     ENHANCED_DIR,
     CONTOURS_DIR,
     COLORED_PIECES_DIR,
+    PACKED_PIECES_DIR,
     BINARY_PIECES_DIR,
     ENHANCED_PIECES_DIR,
     EDGE_PIECES_DIR,
+    RECONSTRUCTED_DIR,
 )
 
-correct = 0
-wrong = 0
-total = 0
+# Solvers take (pieces, grid_size) and return a placement array
+SOLVERS = {
+    "v1": solve_v1,
+    "v2": solve_v2,
+    "beam": solve_beam,
+}
+
+# Artifact levels for process_single_image
+ARTIFACTS_NONE = "none"
+ARTIFACTS_PIECES = "pieces"
+ARTIFACTS_FULL = "full"
+ARTIFACT_LEVELS = (ARTIFACTS_NONE, ARTIFACTS_PIECES, ARTIFACTS_FULL)
 
-def process_single_image(img_path, grid_size, auto_detection):
+def process_single_image(img_path, grid_size, auto_detection, writer=None,
+                         artifacts=ARTIFACTS_FULL, packed=False):
     """
     1. Enhance entire image
     2. Detect grid size (if auto)
     3. Segment into pieces
     4. Threshold & edge detect per piece
+
+    artifacts selects what is written: ARTIFACTS_NONE, ARTIFACTS_PIECES
+    (colored pieces only) or ARTIFACTS_FULL (pieces plus enhanced,
+    contour, binary and edge diagnostics). With packed=True the colored
+    pieces go to one .npy per puzzle under PACKED_PIECES_DIR instead of
+    one PNG per piece.
+
+    Artifacts go through writer (an ArtifactWriter) so encoding and
+    disk I/O overlap with compute. Without one, a private writer is
+    used and flushed before returning.
     """
+    if artifacts not in ARTIFACT_LEVELS:
+        raise ValueError(f"Unknown artifact level {artifacts!r}, expected one of {ARTIFACT_LEVELS}")
+
+    if writer is None and artifacts != ARTIFACTS_NONE:
+        with ArtifactWriter() as writer:
+            return process_single_image(
+                img_path, grid_size, auto_detection, writer, artifacts, packed
+            )
+
+    full = artifacts == ARTIFACTS_FULL
 
     grid_folder = f"{grid_size}x{grid_size}"
     img_name = os.path.splitext(os.path.basename(img_path))[0]
-    original = cv2.imread(img_path)
 
     print(f"\nProcessing {img_name}...")
 
-    # Step 1: Enhance entire image
-    enhanced, enhanced_clahe = enhance_image(original)
-    save_image(enhanced, img_name,
-               os.path.join(ENHANCED_DIR, grid_folder),
-               suffix="enhanced")
+    # Step 1: Enhance entire image (only detection and diagnostics use it).
+    # Full diagnostics need the full-resolution image; detection alone
+    # runs on a reduced grayscale decode, unless that would be full
+    # resolution anyway and the color image is needed for pieces.
+    original = None
+    reduced_detection = auto_detection and not full and (
+        artifacts == ARTIFACTS_NONE or detection_reduce(img_path, DETECTION_MAX_SIDE) > 1
+    )
+
+    if reduced_detection:
+        with timed("decode"):
+            gray, _ = read_detection_image(img_path, DETECTION_MAX_SIDE)
+        enhancement = EnhancedImage(gray)
+    elif full or auto_detection:
+        with timed("decode"):
+            original = cv2.imread(img_path)
+        enhancement = EnhancedImage(original)
+
+    if full:
+        save_image(enhancement.sharp, img_name,
+                   os.path.join(ENHANCED_DIR, grid_folder),
+                   suffix="enhanced", writer=writer)
 
-    # Step 2: Detect grid size
+    # Step 2: Detect grid size (CLAHE only computed if evidence is ambiguous)
     if auto_detection:
-        grid_size = detect_grid_size(enhanced, enhanced_clahe)
+        with timed("grid_detection"):
+            grid_size = detect_grid_size_fast(enhancement.sharp, lambda: enhancement.sharp_clahe)
         print(f"[INFO] Detected grid: {grid_size}x{grid_size}")
 
-    # Step 3: Segment original & enhanced
-    contour_img, cropped_pieces, piece_metadata = segment_and_extract(
-        original, grid_size, img_name
-    )
+    if artifacts == ARTIFACTS_NONE:
+        print(f"Finished {img_name}")
+        return grid_size
 
-    save_image(contour_img, img_name,
-               os.path.join(CONTOURS_DIR, grid_folder),
-               suffix="contours")
+    # Full-resolution color decode, only once pieces are needed
+    if original is None:
+        with timed("decode"):
+            original = cv2.imread(img_path)
 
-    _, cropped_enhanced_pieces, enhanced_piece_metadata = segment_and_extract(
-        enhanced_clahe, grid_size, img_name
-    )
-
-    colored_piece_folder = os.path.join(COLORED_PIECES_DIR, grid_folder, img_name)
-    os.makedirs(colored_piece_folder, exist_ok=True)
+    # Step 3: Segment original & enhanced with one grid computation
+    if full:
+        sharp_clahe = enhancement.sharp_clahe
+        with timed("segmentation"):
+            piece_metadata, (cropped_pieces, cropped_enhanced_pieces) = segment_images(
+                [original, sharp_clahe], grid_size
+            )
+    else:
+        with timed("segmentation"):
+            piece_metadata, (cropped_pieces,) = segment_images([original], grid_size)
+    count("pieces", len(cropped_pieces))
 
     # Save original pieces
-    for piece_info, piece_img in zip(piece_metadata, cropped_pieces):
-        save_image(piece_img, img_name,
-                   colored_piece_folder,
-                   suffix=f"{piece_info['id']}")
-    
+    if packed:
+        writer.submit(save_packed_pieces, cropped_pieces, piece_metadata, img_name,
+                      os.path.join(PACKED_PIECES_DIR, grid_folder))
+    else:
+        colored_piece_folder = os.path.join(COLORED_PIECES_DIR, grid_folder, img_name)
+
+        for piece_info, piece_img in zip(piece_metadata, cropped_pieces):
+            save_image(piece_img, img_name,
+                       colored_piece_folder,
+                       suffix=f"{piece_info['id']}", writer=writer)
+
+    if not full:
+        print(f"Finished {img_name}")
+        return grid_size
+
+    save_image(draw_grid_contours(original, piece_metadata), img_name,
+               os.path.join(CONTOURS_DIR, grid_folder),
+               suffix="contours", writer=writer)
+
     # Save enhanced pieces
     enhanced_piece_folder = os.path.join(ENHANCED_PIECES_DIR, grid_folder, img_name)
-    os.makedirs(enhanced_piece_folder, exist_ok=True)
 
-    for piece_info, piece_img in zip(enhanced_piece_metadata, cropped_enhanced_pieces):
+    for piece_info, piece_img in zip(piece_metadata, cropped_enhanced_pieces):
         save_image(piece_img, img_name,
                    enhanced_piece_folder,
-                   suffix=f"{piece_info['id']}")
+                   suffix=f"{piece_info['id']}", writer=writer)
 
-    # Step 4: Threshold & edge-detect per piece
+    # Step 4: Threshold & edge-detect all pieces in one pass per operation
     binary_piece_folder = os.path.join(BINARY_PIECES_DIR, grid_folder, img_name)
     edge_piece_folder   = os.path.join(EDGE_PIECES_DIR, grid_folder, img_name)
 
-    os.makedirs(binary_piece_folder, exist_ok=True)
-    os.makedirs(edge_piece_folder, exist_ok=True)
+    with timed("threshold_edges"):
+        binary_pieces = threshold_adaptive_tiles(sharp_clahe, piece_metadata)
+        edge_pieces = canny_edges_tiles(sharp_clahe, piece_metadata)
 
-    for piece_info, piece_img in zip(enhanced_piece_metadata, cropped_enhanced_pieces):
-        # Threshold
-        binary_piece = threshold_adaptive(piece_img)
+    for piece_info, binary_piece, edge_piece in zip(piece_metadata, binary_pieces, edge_pieces):
         save_image(binary_piece, img_name,
                    binary_piece_folder,
-                   suffix=f"{piece_info['id']}")
+                   suffix=f"{piece_info['id']}", writer=writer)
 
-        # Edge-detect
-        edge_piece = canny_edges(piece_img)
         save_image(edge_piece, img_name,
                    edge_piece_folder,
-                   suffix=f"{piece_info['id']}")
+                   suffix=f"{piece_info['id']}", writer=writer)
 
     print(f"Finished {img_name}")
     return grid_size
 
 
-results = []
+def _detect_square_grid(enhancement, detector):
+    if detector == "ratios":
+        return detect_grid_size_fast(enhancement.sharp, lambda: enhancement.sharp_clahe)
+
+    if detector == "comb":
+        rows, cols, _ = detect_grid_shape(enhancement.sharp)
+        if rows != cols:
+            raise ValueError(f"Detected a {rows}x{cols} grid; the solvers need a square grid")
+        return rows
+
+    raise ValueError(f"Unknown detector {detector!r}, expected 'ratios' or 'comb'")
+
+
+def solve_image(img, grid_size=None, solver="v2", img_name=None, writer=None,
+                detector="ratios", assemble=True, out=None, refine_budget=None):
+    """
+    Enhance -> detect -> segment -> reconstruct, entirely in memory.
+    Pieces are views into img, nothing is written or re-read.
+
+    img may also be a file path: for images large enough to decode at
+    reduced scale, detection runs on a reduced grayscale decode and the
+    full color image is decoded only for segmentation; smaller images
+    are decoded once, in color.
+
+    grid_size is auto-detected when None, with detector "ratios"
+    (2/4/8 only, the more accurate choice for those) or "comb" (any N
+    up to MAX_GRID, least reliable on small N). Passing img_name
+    also writes the enhanced image, contours, colored pieces and the
+    reconstruction as a side output, through writer when given.
+
+    refine_budget (seconds) adds the anytime local-search refinement
+    after the solver, trading latency for accuracy per call.
+
+    Returns (assembled, grid_size), the canvas written into out when
+    given. With assemble=False no canvas is built and (placement,
+    grid_size) is returned instead.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver!r}, expected one of {sorted(SOLVERS)}")
+
+    save_artifacts = img_name is not None
+
+    if save_artifacts and writer is None:
+        with ArtifactWriter() as writer:
+            return solve_image(img, grid_size, solver, img_name, writer, detector,
+                               assemble, out, refine_budget)
+
+    # Enhancement is lazy: only detection and diagnostics trigger it
+    if isinstance(img, str):
+        reduced_detection = (
+            grid_size is None and not save_artifacts
+            and detection_reduce(img, DETECTION_MAX_SIDE) > 1
+        )
+        if reduced_detection:
+            with timed("decode"):
+                gray, _ = read_detection_image(img, DETECTION_MAX_SIDE)
+            with timed("grid_detection"):
+                grid_size = _detect_square_grid(EnhancedImage(gray), detector)
+
+        with timed("decode"):
+            img = cv2.imread(img)
+
+    enhancement = EnhancedImage(img)
+    if grid_size is None:
+        with timed("grid_detection"):
+            grid_size = _detect_square_grid(enhancement, detector)
+
+    with timed("segmentation"):
+        piece_metadata, (cropped_pieces,) = segment_images([img], grid_size)
+
+    with timed("reconstruction"):
+        placement = SOLVERS[solver](cropped_pieces, grid_size, refine_budget=refine_budget)
+
+    if not assemble and not save_artifacts:
+        return placement, grid_size
+
+    assembled = assemble_pieces(cropped_pieces, placement, out)
+
+    if save_artifacts:
+        grid_folder = f"{grid_size}x{grid_size}"
+
+        save_image(enhancement.sharp, img_name,
+                   os.path.join(ENHANCED_DIR, grid_folder),
+                   suffix="enhanced", writer=writer)
+        save_image(draw_grid_contours(img, piece_metadata), img_name,
+                   os.path.join(CONTOURS_DIR, grid_folder),
+                   suffix="contours", writer=writer)
+
+        colored_piece_folder = os.path.join(COLORED_PIECES_DIR, grid_folder, img_name)
+        for piece_info, piece_img in zip(piece_metadata, cropped_pieces):
+            save_image(piece_img, img_name,
+                       colored_piece_folder,
+                       suffix=f"{piece_info['id']}", writer=writer)
+
+        save_image(assembled, img_name,
+                   os.path.join(RECONSTRUCTED_DIR, grid_folder), writer=writer)
+
+    if not assemble:
+        return placement, grid_size
+
+    return assembled, grid_size
+
+
+def _collect_task(func, name, *args):
+    """
+    Run func(*args) under a fresh Stats named name.
+    Returns (result, stats dict), picklable across worker processes.
+    """
+    with collect(Stats(name)) as stats:
+        with timed("total"):
+            result = func(*args)
+    return result, stats.to_dict()
+
+
+def _run_collected(func, tasks, names, workers, chunksize, stats):
+    """
+    run_tasks, recording one Stats per task into stats when given.
+    """
+    if stats is None:
+        return run_tasks(func, tasks, workers, chunksize)
+
+    collected = run_tasks(
+        _collect_task,
+        [(func, name) + tuple(task) for name, task in zip(names, tasks)],
+        workers, chunksize,
+    )
 
-def process_dataset(dataset_folder, auto_detection):
-    global correct, wrong, total
+    results = []
+    for result, task_stats in collected:
+        stats.add_record(task_stats)
+        results.append(result)
+    return results
 
-    correct = 0
-    wrong = 0
-    total = 0
 
+def process_dataset(dataset_folder, auto_detection, workers=1, chunksize=None,
+                    artifacts=ARTIFACTS_FULL, packed=False, stats=None):
+    """
+    Process every image of a dataset folder, in parallel when
+    workers != 1 (None uses every core). artifacts and packed are
+    passed on to process_single_image.
+
+    With stats (a Stats), per-stage timings and counters of every image
+    are added to it as one record each, ready for to_json / to_csv.
+    Returns the grid-size detection stats when auto_detection is on,
+    otherwise None.
+    """
     name = os.path.basename(dataset_folder)
-        
+
     expected = None
     if "2x2" in name:
         expected = 2
@@ -119,30 +336,36 @@ def process_dataset(dataset_folder, auto_detection):
     elif "8x8" in name:
         expected = 8
 
-    filenames = os.listdir(dataset_folder)
+    filenames = sorted(os.listdir(dataset_folder))
+    tasks = [
+        (os.path.join(dataset_folder, filename), expected, auto_detection,
+         None, artifacts, packed)
+        for filename in filenames
+    ]
 
-    for filename in filenames:
-        img_path = os.path.join(dataset_folder, filename)
+    detected_sizes = _run_collected(
+        process_single_image, tasks, filenames, workers, chunksize, stats
+    )
 
-        detected = process_single_image(img_path, expected, auto_detection)
-        
-        if auto_detection:
-            total += 1
+    if not auto_detection:
+        return None
 
-            if detected is None: wrong += 1
-            elif detected == expected: correct += 1
-            else: wrong += 1
+    total = len(detected_sizes)
+    correct = sum(
+        1 for detected in detected_sizes
+        if detected is not None and detected == expected
+    )
+    wrong = total - correct
 
-    if auto_detection:
-        results.append({
-            "dataset": name,
-            "correct": correct,
-            "wrong": wrong,
-            "total": total,
-            "accuracy": (correct / total * 100) if total != 0 else 0
-        })
-
-def print_accuracy_table():
+    return {
+        "dataset": name,
+        "correct": correct,
+        "wrong": wrong,
+        "total": total,
+        "accuracy": (correct / total * 100) if total != 0 else 0
+    }
+
+def print_accuracy_table(results):
     print("\nFinal Accuracy Table:\n")
     print("{:<15} {:<10} {:<10} {:<10} {:<10}".format(
         "Dataset", "Correct", "Wrong", "Total", "Accuracy"
@@ -153,3 +376,154 @@ def print_accuracy_table():
         print("{:<15} {:<10} {:<10} {:<10} {:<10.2f}".format(
             r["dataset"], r["correct"], r["wrong"], r["total"], r["accuracy"]
         ))
+
+
+def load_puzzle_pieces(puzzle_path):
+    """
+    Pieces of one puzzle, either a directory of PNGs or a packed .npy
+    (memory-mapped, nothing is decoded).
+    """
+    puzzle_path = Path(puzzle_path)
+
+    if puzzle_path.suffix == ".npy":
+        pieces, _ = load_packed_pieces(str(puzzle_path))
+        return pieces
+
+    color_pieces = []
+    for img_path in sorted(puzzle_path.glob("*.png")):
+        img = cv2.imread(str(img_path), cv2.IMREAD_COLOR)
+        if img is not None:
+            color_pieces.append(img)
+
+    return color_pieces
+
+
+def reconstruct_puzzle(puzzle_path, grid_size, solver="v2", feature_cache_dir=None):
+    """
+    Load the colored pieces of one puzzle, reconstruct and save it.
+    With feature_cache_dir, solver features are read from / stored in a
+    FeatureCache there, so re-runs skip feature extraction.
+    Returns the output path, or None if the puzzle was skipped.
+    """
+    puzzle_path = Path(puzzle_path)
+    grid = f"{grid_size}x{grid_size}"
+
+    print(f"Reconstructing {grid}/{puzzle_path.stem}")
+
+    # Load pieces
+    with timed("load_pieces"):
+        color_pieces = load_puzzle_pieces(puzzle_path)
+
+    if len(color_pieces) != grid_size * grid_size:
+        print(f"Skipping (expected {grid_size*grid_size}, got {len(color_pieces)})")
+        return None
+
+    with timed("reconstruction"):
+        cache = FeatureCache(feature_cache_dir) if feature_cache_dir else None
+        placement = SOLVERS[solver](color_pieces, grid_size, cache=cache)
+
+    return _save_reconstruction(puzzle_path, grid_size, color_pieces, placement)
+
+
+def _save_reconstruction(puzzle_path, grid_size, color_pieces, placement):
+    grid = f"{grid_size}x{grid_size}"
+
+    # The canvas is written synchronously, so one buffer per process is reused
+    assembled = assemble_pieces(
+        color_pieces, placement,
+        reusable_canvas(canvas_shape(color_pieces, placement), color_pieces[0].dtype),
+    )
+
+    # Save result
+    out = Path(RECONSTRUCTED_DIR) / grid
+    out.mkdir(parents=True, exist_ok=True)
+    out_path = out / f"{puzzle_path.stem}.png"
+
+    with timed("io.write"):
+        cv2.imwrite(str(out_path), assembled) # type: ignore
+    print("Saved:", out_path)
+    return str(out_path)
+
+
+def reconstruct_puzzle_batch(puzzle_paths, grid_size):
+    """
+    reconstruct_puzzle (v2 solver) for many puzzles of one grid size,
+    solved with solve_v2_batch: puzzles with the same piece shape share
+    one batched seam-cost computation. Returns output paths (None for
+    skipped puzzles) in puzzle_paths order.
+    """
+    grid = f"{grid_size}x{grid_size}"
+    results = [None] * len(puzzle_paths)
+    groups = {}
+
+    for i, puzzle_path in enumerate(puzzle_paths):
+        print(f"Reconstructing {grid}/{Path(puzzle_path).stem}")
+
+        with timed("load_pieces"):
+            color_pieces = load_puzzle_pieces(puzzle_path)
+
+        if len(color_pieces) != grid_size * grid_size:
+            print(f"Skipping (expected {grid_size*grid_size}, got {len(color_pieces)})")
+            continue
+
+        groups.setdefault(color_pieces[0].shape, []).append((i, color_pieces))
+
+    for puzzles in groups.values():
+        with timed("reconstruction"):
+            placements = solve_v2_batch(
+                np.stack([np.asarray(pieces) for _, pieces in puzzles]), grid_size
+            )
+
+        for (i, color_pieces), placement in zip(puzzles, placements):
+            results[i] = _save_reconstruction(
+                Path(puzzle_paths[i]), grid_size, color_pieces, placement
+            )
+
+    return results
+
+
+def reconstruct_dataset(pieces_dir=COLORED_PIECES_DIR, solver="v2", workers=1, chunksize=None,
+                        stats=None, feature_cache_dir=None, batch_size=None):
+    """
+    Reconstruct every puzzle under pieces_dir/<N>x<N>/ (PNG folders or
+    packed .npy files), in parallel when workers != 1.
+    With stats (a Stats), one record per puzzle is added to it;
+    feature_cache_dir is passed on to reconstruct_puzzle.
+
+    With batch_size (v2 only), every task solves up to batch_size
+    puzzles of one grid size through reconstruct_puzzle_batch, which
+    amortizes per-puzzle overhead on small grids (no feature cache;
+    one stats record per batch).
+    Returns output paths in sorted puzzle order.
+    """
+    if batch_size is not None and solver != "v2":
+        raise ValueError(f"Batched reconstruction needs the v2 solver, got {solver!r}")
+
+    tasks = []
+    names = []
+    for grid_path in sorted(Path(pieces_dir).iterdir()):
+        if not grid_path.is_dir():
+            continue
+
+        grid_size = int(grid_path.name.split("x")[0])
+
+        puzzle_paths = [
+            str(puzzle_path) for puzzle_path in sorted(grid_path.iterdir())
+            if puzzle_path.is_dir() or puzzle_path.suffix == ".npy"
+        ]
+
+        if batch_size is None:
+            for puzzle_path in puzzle_paths:
+                tasks.append((puzzle_path, grid_size, solver, feature_cache_dir))
+                names.append(f"{grid_path.name}/{Path(puzzle_path).stem}")
+            continue
+
+        for start in range(0, len(puzzle_paths), batch_size):
+            tasks.append((puzzle_paths[start:start + batch_size], grid_size))
+            names.append(f"{grid_path.name}/batch_{start // batch_size}")
+
+    if batch_size is None:
+        return _run_collected(reconstruct_puzzle, tasks, names, workers, chunksize, stats)
+
+    batches = _run_collected(reconstruct_puzzle_batch, tasks, names, workers, chunksize, stats)
+    return [path for batch in batches for path in batch]
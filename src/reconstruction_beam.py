@@ -0,0 +1,157 @@
+import numpy as np
+
+from src.assembly import assemble_pieces
+from src.feature_cache import cached_features
+from src.instrumentation import count, timed
+from src.reconstruction_v2 import edge_feature_params, extract_edge_features, seam_costs_from_features
+from src.refinement import MAX_SEAM_COST, normalize_seam_costs, placement_cost, refine_placement
+
+BEAM_WIDTH = 256 # partial solutions kept per cell
+
+
+def _remaining_bound(in_horizontal, in_vertical, used, filled, rows, cols):
+    """
+    Admissible lower bound on the seams still to be added once cells
+    0..filled-1 (row-major) are filled: every remaining cell with a left
+    neighbor adds at least the cheapest left seam into its piece, every
+    one with a top neighbor the cheapest top seam, and each unused piece
+    fills one cell, so the k smallest such values over the unused pieces
+    bound each side. Returns one bound per state (row of used).
+    """
+    remaining = np.arange(filled, rows * cols)
+    needed = (
+        int(np.count_nonzero(remaining % cols)),
+        int(np.count_nonzero(remaining >= cols)),
+    )
+
+    bound = np.zeros(len(used))
+    for cheapest, k in zip((in_horizontal, in_vertical), needed):
+        if k:
+            values = np.where(used, np.inf, cheapest)
+            bound += np.partition(values, k - 1, axis=1)[:, :k].sum(axis=1)
+
+    return bound
+
+
+def beam_search(horizontal, vertical, rows, cols, beam_width=BEAM_WIDTH, upper_bound=np.inf):
+    """
+    Fill a rows x cols grid in row-major order, keeping the beam_width
+    partial placements with the lowest cost + lower bound. Candidates
+    whose bound already reaches upper_bound (cost of a known solution)
+    are pruned.
+
+    Exact (the minimum of the given costs) when no level had to drop
+    candidates beyond the pruned ones; returns (placement, cost, exact),
+    or (None, inf, exact) when nothing beats upper_bound.
+    """
+    num_pieces = horizontal.shape[0]
+
+    in_horizontal = horizontal.min(axis=0)
+    in_vertical = vertical.min(axis=0)
+
+    placed = np.empty((1, 0), dtype=np.intp)
+    used = np.zeros((1, num_pieces), dtype=bool)
+    cost = np.zeros(1)
+    exact = True
+
+    for cell in range(rows * cols):
+        row, col = divmod(cell, cols)
+
+        child_cost = np.repeat(cost[:, None], num_pieces, axis=1)
+        if col > 0:
+            child_cost += horizontal[placed[:, cell - 1]]
+        if row > 0:
+            child_cost += vertical[placed[:, cell - cols]]
+        np.putmask(child_cost, used, np.inf)
+
+        # Bound over the cells after this one, from the parent's unused pieces
+        bound = child_cost + _remaining_bound(
+            in_horizontal, in_vertical, used, cell + 1, rows, cols
+        )[:, None]
+        bound[bound >= upper_bound] = np.inf
+
+        flat = bound.ravel()
+        candidates = np.flatnonzero(np.isfinite(flat))
+        if len(candidates) == 0:
+            return None, np.inf, exact
+
+        if len(candidates) > beam_width:
+            exact = False
+            count("beam.truncated_levels")
+            part = np.argpartition(flat[candidates], beam_width - 1)[:beam_width]
+            candidates = candidates[part]
+
+        candidates = candidates[np.argsort(flat[candidates], kind="stable")]
+        parent, piece = np.divmod(candidates, num_pieces)
+
+        placed = np.concatenate([placed[parent], piece[:, None]], axis=1)
+        used = used[parent]
+        used[np.arange(len(piece)), piece] = True
+        cost = child_cost[parent, piece]
+
+    best = int(np.argmin(cost))
+    return placed[best].reshape(rows, cols), float(cost[best]), exact
+
+
+def beam_costs(color_pieces, cache=None):
+    """
+    (horizontal, vertical) costs the beam solver minimizes: v2 LAB seam
+    costs divided by each row's runner-up (see normalize_seam_costs).
+    """
+    features = cached_features(
+        cache, color_pieces, edge_feature_params(), extract_edge_features,
+        border=edge_feature_params()["lines"],
+    )
+    (horizontal, _), (vertical, _) = seam_costs_from_features(features)
+
+    return normalize_seam_costs(horizontal), normalize_seam_costs(vertical)
+
+
+def solve_beam(color_pieces, grid_size, beam_width=BEAM_WIDTH, cache=None, refine_budget=None):
+    """
+    Beam search / branch-and-bound solve. Returns the placement: a
+    (grid_size, grid_size) array of piece indices.
+
+    A greedy pass (beam width 1) gives the initial upper bound; the
+    main search prunes with an admissible lower bound and is exact
+    whenever the beam never overflows (e.g. every 2x2 puzzle with the
+    default width). refine_budget (seconds) adds refine_placement.
+
+    Exact means optimal for the normalized seam cost (beam_costs), not
+    correct: the optimum of that objective can still be a wrong
+    reconstruction.
+    """
+    n = grid_size * grid_size
+    if len(color_pieces) != n:
+        raise ValueError(f"Expected {n} pieces, got {len(color_pieces)}")
+
+    with timed("beam.costs"):
+        horizontal, vertical = beam_costs(color_pieces, cache)
+        horizontal = np.minimum(horizontal, MAX_SEAM_COST)
+        vertical = np.minimum(vertical, MAX_SEAM_COST)
+
+    with timed("beam.search"):
+        placement, _, _ = beam_search(horizontal, vertical, grid_size, grid_size, beam_width=1)
+        incumbent = placement_cost(placement, horizontal, vertical)
+
+        improved, _, exact = beam_search(
+            horizontal, vertical, grid_size, grid_size, beam_width, upper_bound=incumbent
+        )
+        if improved is not None:
+            placement = improved
+
+    count("beam.exact", int(exact))
+
+    if refine_budget is not None:
+        placement = refine_placement(
+            placement, horizontal, vertical, time_budget=refine_budget, normalize=False
+        )
+
+    return placement
+
+
+def start_reconstruction_beam(color_pieces, grid_size, out=None):
+    """
+    solve_beam followed by assembly (into out when given).
+    """
+    return assemble_pieces(color_pieces, solve_beam(color_pieces, grid_size), out)
@@ -2,6 +2,11 @@ import cv2
 import numpy as np
 from itertools import permutations
 
+from src.assembly import assemble_pieces
+from src.feature_cache import cached_features
+from src.instrumentation import count, timed
+from src.refinement import refine_placement
+
 # EDGE SLICING
 def slice_edges_color(img):
     border = 5
@@ -54,7 +59,6 @@ def edge_color_distance(a_bgr, b_bgr, orientation="vertical"):
     """
     Compute color distance between two edge strips.
     """
-
     hsv_a = cv2.cvtColor(a_bgr, cv2.COLOR_BGR2HSV)
     hsv_b = cv2.cvtColor(b_bgr, cv2.COLOR_BGR2HSV)
 
@@ -84,53 +88,147 @@ def edge_color_distance(a_bgr, b_bgr, orientation="vertical"):
     return d
 
 
-def start_reconstruction_v1(color_pieces, grid_size):
+# EDGE FEATURES
+TOP, RIGHT, BOTTOM, LEFT = range(4)
+
+# Everything that determines the edge histograms, part of their cache key
+HISTOGRAM_PARAMS = {
+    "feature": "v1_edge_histograms",
+    "color_space": "HSV",
+    "channels": [0, 1],
+    "bins": [16, 16],
+    "border": 5,
+    "v_thresh": 10,
+}
+
+
+def _strip_histogram(bgr_strip):
+    hsv = cv2.cvtColor(bgr_strip, cv2.COLOR_BGR2HSV)
+    return _edge_histogram(hsv, _background_mask(hsv))
+
+
+def compute_edge_histograms(color_pieces):
+    """
+    Compute the HS histogram of every edge strip once per puzzle.
+    Returns a float32 array of shape (N, 4, 256) indexed by
+    [piece, side], sides ordered TOP, RIGHT, BOTTOM, LEFT.
+
+    Flipped strips are not stored: the background mask of a flipped
+    strip is the flipped mask and a histogram ignores pixel order, so
+    the flipped histogram is identical to the plain one.
+    """
+    hists = np.empty((len(color_pieces), 4, 16 * 16), np.float32)
+
+    for i, img in enumerate(color_pieces):
+        for side, strip in enumerate(slice_edges_color(img)):
+            hists[i, side] = _strip_histogram(strip).ravel()
+
+    return hists
+
+
+def histogram_distance(h1, h2):
+    """
+    Bhattacharyya distance between two cached edge histograms.
+    Matches edge_color_distance on the underlying strips.
+    """
+    d = cv2.compareHist(h1, h2, cv2.HISTCMP_BHATTACHARYYA)
+
+    if not np.isfinite(d):
+        return 1e9
+
+    return d
+
+
+def compute_distance_matrices(hists):
+    """
+    All-pairs Bhattacharyya distances between cached edge histograms.
+    Returns (horizontal, vertical) float64 arrays of shape (N, N):
+      horizontal[i, j]: right edge of i vs left edge of j
+      vertical[i, j]:   bottom edge of i vs top edge of j
+
+    Same formula as cv2.compareHist, so entries match
+    edge_color_distance / histogram_distance up to float rounding.
+    """
+    roots = np.sqrt(hists.astype(np.float64))
+    sums = hists.sum(axis=2, dtype=np.float64)
+
+    def bhattacharyya(src_side, dst_side):
+        coeff = roots[:, src_side] @ roots[:, dst_side].T
+        norm = sums[:, src_side, None] * sums[None, :, dst_side]
+        scale = np.ones_like(norm)
+        valid = np.abs(norm) > np.finfo(np.float32).eps
+        scale[valid] = 1.0 / np.sqrt(norm[valid])
+
+        d = np.sqrt(np.maximum(1.0 - coeff * scale, 0.0))
+        d[~np.isfinite(d)] = 1e9
+        return d
+
+    return bhattacharyya(RIGHT, LEFT), bhattacharyya(BOTTOM, TOP)
+
+
+def _histogram_features(color_pieces):
+    return {"histograms": compute_edge_histograms(color_pieces)}
+
+
+def solve_v1(color_pieces, grid_size, cache=None, refine_budget=None):
+    """
+    Greedy v1 solve. Returns the placement: a (grid_size, grid_size)
+    array of piece indices. With cache (a FeatureCache) edge
+    histograms are reused across runs on the same pieces.
+
+    refine_budget (seconds) runs refine_placement on the histogram
+    distances after the greedy solve.
+    """
     n = grid_size * grid_size
     if len(color_pieces) != n:
         raise ValueError(f"Expected {n} pieces, got {len(color_pieces)}")
 
-    # Build piece dicts
-    pieces = []
-    for img in color_pieces:
-        top, right, bottom, left = slice_edges_color(img)
-        pieces.append({
-            "img": img,
-            "top": top,
-            "right": right,
-            "bottom": bottom,
-            "left": left,
-        })
+    # Edge histograms, computed once per piece side
+    with timed("v1.edge_histograms"):
+        hists = cached_features(
+            cache, color_pieces, HISTOGRAM_PARAMS, _histogram_features,
+            border=HISTOGRAM_PARAMS["border"],
+        )["histograms"]
+
+    with timed("v1.distance_matrices"):
+        horizontal, vertical = compute_distance_matrices(hists)
+    count("v1.edge_comparisons", 2 * n * n)
 
     # Solve
-    if grid_size == 2:
-        tl, tr, bl, br = solve_2x2(pieces) # type: ignore
-        grid = [[tl, tr], [bl, br]]
-    else:
-        grid = solve_NxN(pieces, grid_size)
+    with timed("v1.solve"):
+        if grid_size == 2:
+            tl, tr, bl, br = solve_2x2(horizontal, vertical) # type: ignore
+            grid = [[tl, tr], [bl, br]]
+        else:
+            grid = solve_NxN(horizontal, vertical, grid_size)
 
-    # Assemble
-    h, w = color_pieces[0].shape[:2]
-    canvas = np.zeros((grid_size*h, grid_size*w, 3), np.uint8)
+    placement = np.array(grid, dtype=np.intp)
 
-    for r in range(grid_size):
-        for c in range(grid_size):
-            canvas[r*h:(r+1)*h, c*w:(c+1)*w] = grid[r][c]["img"]
+    if refine_budget is not None:
+        placement = refine_placement(placement, horizontal, vertical, time_budget=refine_budget)
 
-    return canvas
+    return placement
+
+
+def start_reconstruction_v1(color_pieces, grid_size, out=None):
+    """
+    solve_v1 followed by assembly (into out when given).
+    """
+    return assemble_pieces(color_pieces, solve_v1(color_pieces, grid_size), out)
 
 
 # SOLVERS
-def solve_2x2(pieces):
+def solve_2x2(horizontal, vertical):
     best_combo = None
     lowest = float("inf")
 
-    for perm in permutations(pieces):
+    for perm in permutations(range(len(horizontal))):
         tl, tr, bl, br = perm
         val = (
-            edge_color_distance(tl["right"], tr["left"], "vertical") +
-            edge_color_distance(tl["bottom"], bl["top"], "horizontal") +
-            edge_color_distance(tr["bottom"], br["top"], "horizontal") +
-            edge_color_distance(bl["right"], br["left"], "vertical")
+            horizontal[tl, tr] +
+            vertical[tl, bl] +
+            vertical[tr, br] +
+            horizontal[bl, br]
         )
         if val < lowest:
             lowest = val
@@ -138,78 +236,27 @@ def solve_2x2(pieces):
 
     return best_combo
 
-def solve_NxN(pieces, size):
+def solve_NxN(horizontal, vertical, size):
     board = [[None] * size for _ in range(size)]
-    pool = list(pieces)
+    pool = np.arange(len(horizontal))
 
     for r in range(size):
         for c in range(size):
-            best = None
-            best_cost = float("inf")
-            best_idx = -1
-
-            for i, piece in enumerate(pool):
-                total = 0.0
+            total = np.zeros(len(pool))
 
-                if c > 0:
-                    left = board[r][c - 1]
-                    total += edge_color_distance(
-                        left["right"], piece["left"], "vertical"
-                    )
+            if c > 0:
+                total += horizontal[board[r][c - 1], pool]
 
-                if r > 0:
-                    top = board[r - 1][c]
-                    total += edge_color_distance(
-                        top["bottom"], piece["top"], "horizontal"
-                    )
+            if r > 0:
+                total += vertical[board[r - 1][c], pool]
 
-                if not np.isfinite(total):
-                    total = 1e9
+            total[~np.isfinite(total)] = 1e9
 
-                if total < best_cost:
-                    best_cost = total
-                    best = piece
-                    best_idx = i
+            # First minimum, same tie-breaking as a sequential scan
+            best_idx = int(np.argmin(total))
 
-            if best is None:
-                best_idx = 0
-                best = pool[0]
-
-            board[r][c] = best
-            pool.pop(best_idx)
+            board[r][c] = int(pool[best_idx])
+            pool = np.delete(pool, best_idx)
 
     return board
 
-
-# ASSEMBLY
-def assemble_2x2(a, b, c, d):
-    imgs = [cv2.imread(x["src"]) for x in (a, b, c, d)]
-    if any(im is None for im in imgs):
-        missing = [i for i, im in enumerate(imgs) if im is None]
-        raise FileNotFoundError(f"assemble_2x2: missing images at indices {missing}")
-
-    h, w = imgs[0].shape[:2] # type: ignore
-    canvas = np.zeros((2*h, 2*w, 3), np.uint8)
-    canvas[:h, :w] = imgs[0]
-    canvas[:h, w:] = imgs[1]
-    canvas[h:, :w] = imgs[2]
-    canvas[h:, w:] = imgs[3]
-    return canvas
-
-def assemble_NxN(grid):
-    n = len(grid)
-    base = cv2.imread(grid[0][0]["src"])
-    if base is None:
-        raise FileNotFoundError(f"assemble_NxN: cannot read {grid[0][0]['src']}")
-
-    h, w = base.shape[:2]
-    canvas = np.zeros((n*h, n*w, 3), np.uint8)
-
-    for r in range(n):
-        for c in range(n):
-            img = cv2.imread(grid[r][c]["src"])
-            if img is None:
-                raise FileNotFoundError(f"assemble_NxN: cannot read {grid[r][c]['src']}")
-            canvas[r*h:(r+1)*h, c*w:(c+1)*w] = img
-
-    return canvas
@@ -1,28 +1,183 @@
 import cv2
 import numpy as np
 
-HORIZONTAL = "horizontal"
-VERTICAL = "vertical"
+from src.assembly import assemble_pieces, canvas_shape
+from src.feature_cache import cached_features
+from src.instrumentation import count, timed
+from src.refinement import refine_placement
+
+HORIZONTAL = 0
+VERTICAL = 1
 
 # Seam cost computation
-def compute_seam_costs(lab_pieces):
-    left_edges = np.stack([p[:, 0] for p in lab_pieces])
-    right_edges = np.stack([p[:, -1] for p in lab_pieces])
-    top_edges = np.stack([p[0] for p in lab_pieces])
-    bottom_edges = np.stack([p[-1] for p in lab_pieces])
-
-    left_l_std = left_edges[..., 0].std(axis=1)
-    right_l_std = right_edges[..., 0].std(axis=1)
-    top_l_std = top_edges[..., 0].std(axis=1)
-    bottom_l_std = bottom_edges[..., 0].std(axis=1)
-
-    horizontal_cost = np.mean(
-        np.abs(right_edges[:, None] - left_edges[None]), axis=(2, 3)
-    )
-    vertical_cost = np.mean(
-        np.abs(bottom_edges[:, None] - top_edges[None]), axis=(2, 3)
+SEAM_BLOCK_BYTES = 64 * 1024 * 1024 # scratch memory per orientation
+SPARSE_K = 2 # candidates kept per piece side in sparse mode (scoring reads the best two)
+BATCH_BLOCK_BYTES = 4 * 1024 * 1024 # batched mode: whole puzzles per block, cache-sized
+
+
+# Edge features
+SIDES = ("top", "right", "bottom", "left") # order of the packed side axis
+EDGE_DTYPES = ("float32", "int16", "uint8") # storage types for LAB edge lines
+
+
+def edge_feature_params(dtype="float32"):
+    """
+    Everything that determines the edge features, part of their cache key.
+    """
+    return {
+        "feature": "v2_edges",
+        "layout": "packed",
+        "color_space": "LAB",
+        "dtype": np.dtype(dtype).name,
+        "lines": 1,
+    }
+
+
+def _side_lines(pieces):
+    """
+    Outermost line of every side, as (N, L, C) arrays in SIDES order.
+    """
+    if isinstance(pieces, np.ndarray):
+        return pieces[:, 0], pieces[:, :, -1], pieces[:, -1], pieces[:, :, 0]
+
+    return (
+        np.stack([p[0] for p in pieces]),
+        np.stack([p[:, -1] for p in pieces]),
+        np.stack([p[-1] for p in pieces]),
+        np.stack([p[:, 0] for p in pieces]),
     )
 
+
+def _l_std(edges):
+    return edges[..., 0].astype(np.float32, copy=False).std(axis=1)
+
+
+def _with_std(features):
+    features["std"] = np.stack([_l_std(edges) for edges in edge_sides(features)], axis=1)
+    return features
+
+
+def edge_sides(features):
+    """
+    (top, right, bottom, left) edge lines of a feature dict, (N, L, 3) each.
+    """
+    if "edges" in features:
+        edges = features["edges"]
+        return tuple(edges[:, side] for side in range(len(SIDES)))
+
+    return tuple(features[side] for side in SIDES)
+
+
+def extract_edge_lines(color_pieces, dtype="float32"):
+    """
+    The outermost line of every side converted to LAB and packed into
+    one contiguous (N, 4, L, 3) array, sides in SIDES order. Only these
+    4 * L pixels per piece are converted, never the whole tile.
+
+    color_pieces is a list of square BGR pieces or an (N, L, L, 3) array.
+    dtype is float32, or int16 / uint8 for compact storage (LAB of
+    8-bit input is integral, so no precision is lost).
+    """
+    height, width = color_pieces[0].shape[:2]
+    if height != width:
+        raise ValueError(f"Packed edge lines need square pieces, got {height}x{width}")
+
+    lines = np.empty((len(color_pieces), len(SIDES), width, 3), np.uint8)
+    for side, side_lines in enumerate(_side_lines(color_pieces)):
+        lines[:, side] = side_lines
+
+    lab = cv2.cvtColor(lines.reshape(-1, width, 3), cv2.COLOR_BGR2LAB)
+    return lab.reshape(lines.shape).astype(dtype, copy=False)
+
+
+def extract_edge_features(color_pieces, dtype="float32"):
+    """
+    LAB edge lines of every piece and the std of their L channel.
+    Returns a dict with "std" (N, 4) float32 and, for square pieces,
+    "edges" (N, 4, L, 3) from extract_edge_lines; otherwise one
+    (N, L, 3) array per side name.
+    """
+    height, width = color_pieces[0].shape[:2]
+
+    if height == width:
+        features = {"edges": extract_edge_lines(color_pieces, dtype)}
+    else:
+        features = {
+            side: cv2.cvtColor(np.ascontiguousarray(lines), cv2.COLOR_BGR2LAB)
+                     .astype(dtype, copy=False)
+            for side, lines in zip(SIDES, _side_lines(color_pieces))
+        }
+
+    return _with_std(features)
+
+
+def _edge_features(lab_pieces):
+    """
+    Feature dict from pieces already converted to LAB.
+    """
+    return _with_std(dict(zip(SIDES, _side_lines(lab_pieces))))
+
+
+def _seam_dtypes(edges):
+    """
+    (difference buffer dtype, cost dtype) for edges stored as edges.dtype.
+    Integer storage is widened to int16 so differences cannot wrap.
+    """
+    if np.issubdtype(edges.dtype, np.integer):
+        return np.dtype(np.int16), np.dtype(np.float32)
+    return edges.dtype, edges.dtype
+
+
+def _iter_seam_cost_blocks(src_edges, dst_edges, max_block_bytes):
+    """
+    Mean absolute difference between every src edge and every dst edge.
+    Yields (start, stop, cost_rows) for blocks of src rows so the
+    (rows, N, L, 3) difference buffer stays within max_block_bytes,
+    reusing one buffer throughout.
+    """
+    work_dtype, cost_dtype = _seam_dtypes(src_edges)
+
+    num_pieces = src_edges.shape[0]
+    row_bytes = dst_edges.size * work_dtype.itemsize
+    rows_per_block = int(min(num_pieces, max(1, max_block_bytes // row_bytes)))
+
+    buffer = np.empty((rows_per_block,) + dst_edges.shape, dtype=work_dtype)
+
+    for start in range(0, num_pieces, rows_per_block):
+        stop = min(start + rows_per_block, num_pieces)
+        block = buffer[: stop - start]
+
+        np.subtract(src_edges[start:stop, None], dst_edges[None], out=block, dtype=work_dtype)
+        np.abs(block, out=block)
+        yield start, stop, block.mean(axis=(2, 3), dtype=cost_dtype)
+
+
+def _pairwise_seam_cost(src_edges, dst_edges, max_block_bytes):
+    num_pieces = src_edges.shape[0]
+    cost = np.empty((num_pieces, num_pieces), dtype=_seam_dtypes(src_edges)[1])
+
+    for start, stop, cost_rows in _iter_seam_cost_blocks(
+        src_edges, dst_edges, max_block_bytes
+    ):
+        cost[start:stop] = cost_rows
+
+    return cost
+
+
+def compute_seam_costs(lab_pieces, max_block_bytes=SEAM_BLOCK_BYTES):
+    return seam_costs_from_features(_edge_features(lab_pieces), max_block_bytes)
+
+
+def seam_costs_from_features(features, max_block_bytes=SEAM_BLOCK_BYTES):
+    """
+    Dense seam costs and variances from extract_edge_features output.
+    """
+    top_edges, right_edges, bottom_edges, left_edges = edge_sides(features)
+    top_l_std, right_l_std, bottom_l_std, left_l_std = features["std"].T
+
+    horizontal_cost = _pairwise_seam_cost(right_edges, left_edges, max_block_bytes)
+    vertical_cost = _pairwise_seam_cost(bottom_edges, top_edges, max_block_bytes)
+
     horizontal_variance = 0.5 * (right_l_std[:, None] + left_l_std[None])
     vertical_variance = 0.5 * (bottom_l_std[:, None] + top_l_std[None])
 
@@ -35,14 +190,264 @@ def compute_seam_costs(lab_pieces):
     )
 
 
+# Batched seam costs
+def extract_edge_features_batch(pieces_batch, dtype="float32"):
+    """
+    extract_edge_features for B same-size puzzles stacked as a
+    (B, N, H, W, 3) array, in one color conversion. Every array gets a
+    leading batch axis: "std" is (B, N, 4) and, for square pieces,
+    "edges" is (B, N, 4, L, 3); otherwise one (B, N, L, 3) array per side.
+    """
+    batch, num_pieces = pieces_batch.shape[:2]
+    features = extract_edge_features(
+        pieces_batch.reshape((-1,) + pieces_batch.shape[2:]), dtype
+    )
+
+    return {
+        name: array.reshape((batch, num_pieces) + array.shape[1:])
+        for name, array in features.items()
+    }
+
+
+def _batch_pairwise_seam_cost(src_edges, dst_edges, max_block_bytes):
+    """
+    _pairwise_seam_cost of every puzzle of (B, N, L, 3) edge stacks,
+    as (B, N, N), with as many whole puzzles per block as fit in
+    max_block_bytes. Gives the same values as the per-puzzle version.
+    """
+    work_dtype, cost_dtype = _seam_dtypes(src_edges)
+    batch, num_pieces = src_edges.shape[:2]
+    cost = np.empty((batch, num_pieces, num_pieces), dtype=cost_dtype)
+
+    puzzle_bytes = num_pieces * dst_edges[0].size * work_dtype.itemsize
+    if puzzle_bytes > max_block_bytes:
+        for b in range(batch):
+            cost[b] = _pairwise_seam_cost(src_edges[b], dst_edges[b], max_block_bytes)
+        return cost
+
+    puzzles_per_block = int(min(batch, max_block_bytes // puzzle_bytes))
+    buffer = np.empty(
+        (puzzles_per_block, num_pieces) + dst_edges.shape[1:], dtype=work_dtype
+    )
+
+    for start in range(0, batch, puzzles_per_block):
+        stop = min(start + puzzles_per_block, batch)
+        block = buffer[: stop - start]
+
+        np.subtract(
+            src_edges[start:stop, :, None], dst_edges[start:stop, None], out=block,
+            dtype=work_dtype,
+        )
+        np.abs(block, out=block)
+        cost[start:stop] = block.mean(axis=(3, 4), dtype=cost_dtype)
+
+    return cost
+
+
+def seam_costs_from_features_batch(features, max_block_bytes=BATCH_BLOCK_BYTES):
+    """
+    seam_costs_from_features for extract_edge_features_batch output:
+    the same tuples with a leading batch axis, (B, N, N) each.
+    """
+    if "edges" in features:
+        top_edges, right_edges, bottom_edges, left_edges = np.moveaxis(features["edges"], 2, 0)
+    else:
+        top_edges, right_edges, bottom_edges, left_edges = (features[side] for side in SIDES)
+    top_l_std, right_l_std, bottom_l_std, left_l_std = np.moveaxis(features["std"], 2, 0)
+
+    horizontal_cost = _batch_pairwise_seam_cost(right_edges, left_edges, max_block_bytes)
+    vertical_cost = _batch_pairwise_seam_cost(bottom_edges, top_edges, max_block_bytes)
+
+    horizontal_variance = 0.5 * (right_l_std[:, :, None] + left_l_std[:, None])
+    vertical_variance = 0.5 * (bottom_l_std[:, :, None] + top_l_std[:, None])
+
+    diagonal = np.arange(left_edges.shape[1])
+    horizontal_cost[:, diagonal, diagonal] = np.inf
+    vertical_cost[:, diagonal, diagonal] = np.inf
+
+    return (
+        (horizontal_cost, horizontal_variance),
+        (vertical_cost, vertical_variance),
+    )
+
+
+# Sparse candidate index
+def _seam_candidates(src_edges, dst_edges, src_std, dst_std, k, max_block_bytes):
+    """
+    Keep only the k cheapest dst candidates for every src edge.
+    Returns (indices, costs, variances, best_incoming): the first three
+    are (N, k) arrays sorted by cost, best_incoming[j] is the src with
+    the cheapest seam into j (first index on ties, like np.argmin).
+    """
+    num_pieces = src_edges.shape[0]
+    k = min(k, num_pieces - 1)
+
+    indices = np.empty((num_pieces, k), dtype=np.intp)
+    cost_dtype = _seam_dtypes(src_edges)[1]
+    costs = np.empty((num_pieces, k), dtype=cost_dtype)
+    incoming_cost = np.full(num_pieces, np.inf, dtype=cost_dtype)
+    best_incoming = np.zeros(num_pieces, dtype=np.intp)
+
+    for start, stop, cost_rows in _iter_seam_cost_blocks(
+        src_edges, dst_edges, max_block_bytes
+    ):
+        rows = np.arange(stop - start)
+        cost_rows[rows, rows + start] = np.inf # no self-matching
+
+        part = np.argpartition(cost_rows, k - 1, axis=1)[:, :k]
+        part_cost = np.take_along_axis(cost_rows, part, axis=1)
+        order = np.argsort(part_cost, axis=1, kind="stable")
+
+        indices[start:stop] = np.take_along_axis(part, order, axis=1)
+        costs[start:stop] = np.take_along_axis(part_cost, order, axis=1)
+
+        # Running column minimum; strict < keeps the first index on ties
+        block_best = cost_rows.argmin(axis=0)
+        block_cost = cost_rows[block_best, np.arange(num_pieces)]
+        improved = block_cost < incoming_cost
+        incoming_cost[improved] = block_cost[improved]
+        best_incoming[improved] = block_best[improved] + start
+
+    variances = 0.5 * (src_std[:, None] + dst_std[indices])
+
+    return indices, costs, variances, best_incoming
+
+
+def _kth_pair_sum(pairs, kth):
+    """
+    kth smallest value (0-based) of a_i + b_j over all (a, b) in pairs,
+    found by bisection on sorted arrays without materializing the sums.
+    """
+    pairs = [(np.sort(a.astype(np.float64)), np.sort(b.astype(np.float64))) for a, b in pairs]
+
+    lo = min(a[0] + b[0] for a, b in pairs)
+    hi = max(a[-1] + b[-1] for a, b in pairs)
+
+    for _ in range(64):
+        mid = 0.5 * (lo + hi)
+        below = sum(
+            int(np.searchsorted(b, mid - a, side="right").sum()) for a, b in pairs
+        )
+        if below > kth:
+            hi = mid
+        else:
+            lo = mid
+
+    return hi
+
+
+def compute_seam_candidates(lab_pieces, k=SPARSE_K, max_block_bytes=SEAM_BLOCK_BYTES):
+    """
+    Sparse counterpart of compute_seam_costs using O(N * k) memory.
+    Returns (horizontal_candidates, vertical_candidates, variance_scale).
+
+    variance_scale is the median seam variance over all N x N pairs of
+    both orientations, the same statistic score_edges derives from the
+    dense matrices (equal up to float rounding).
+    """
+    return seam_candidates_from_features(_edge_features(lab_pieces), k, max_block_bytes)
+
+
+def seam_candidates_from_features(features, k=SPARSE_K, max_block_bytes=SEAM_BLOCK_BYTES):
+    top_edges, right_edges, bottom_edges, left_edges = edge_sides(features)
+    top_l_std, right_l_std, bottom_l_std, left_l_std = features["std"].T
+
+    horizontal_candidates = _seam_candidates(
+        right_edges, left_edges, right_l_std, left_l_std, k, max_block_bytes
+    )
+    vertical_candidates = _seam_candidates(
+        bottom_edges, top_edges, bottom_l_std, top_l_std, k, max_block_bytes
+    )
+
+    # Median of 0.5 * (src_std + dst_std) over 2 * N^2 pairs (even count)
+    pairs = ((right_l_std, left_l_std), (bottom_l_std, top_l_std))
+    middle = len(left_edges) ** 2
+    variance_scale = 0.25 * (
+        _kth_pair_sum(pairs, middle - 1) + _kth_pair_sum(pairs, middle)
+    )
+
+    return horizontal_candidates, vertical_candidates, variance_scale
+
+
 # Edge scoring
+VAR_WEIGHT = 0.5 # strength of variance penalty
+
+
+# Scored candidate edges, sorted by ascending score
+SCORED_EDGE_DTYPE = np.dtype([
+    ("score", np.float64),
+    ("src", np.intp),
+    ("dst", np.intp),
+    ("orientation", np.int8),
+])
+
+
+def _score_orientation(matches, variance_scale):
+    best_match, best_cost, second_cost, best_variance, best_incoming = matches
+
+    score = best_cost / second_cost
+
+    # Mutual-best bonus
+    mutual = np.take_along_axis(best_incoming, best_match, axis=-1) == np.arange(
+        best_match.shape[-1]
+    )
+    score = score - 0.5 * mutual.astype(score.dtype)
+
+    # Smooth variance-based penalty
+    return score + VAR_WEIGHT * np.exp(-best_variance / variance_scale)
+
+
+def _score_best_matches(horizontal_matches, vertical_matches, variance_scale):
+    """
+    Score every piece's best match per orientation. Each *_matches is
+    (best_match, best_cost, second_cost, best_variance, best_incoming).
+    Rows are laid out piece by piece (horizontal, then vertical) before
+    the stable sort, so ties keep that order. Arrays with a leading
+    batch axis give one sorted row of edges per puzzle.
+    """
+    shape = horizontal_matches[0].shape
+
+    scored_edges = np.empty(shape + (2,), dtype=SCORED_EDGE_DTYPE)
+    scored_edges["src"] = np.arange(shape[-1])[:, None]
+
+    for column, (matches, orientation) in enumerate((
+        (horizontal_matches, HORIZONTAL),
+        (vertical_matches, VERTICAL),
+    )):
+        scored_edges["score"][..., column] = _score_orientation(matches, variance_scale)
+        scored_edges["dst"][..., column] = matches[0]
+        scored_edges["orientation"][..., column] = orientation
+
+    scored_edges = scored_edges.reshape(shape[:-1] + (-1,))
+    order = np.argsort(scored_edges["score"], axis=-1, kind="stable")
+    return np.take_along_axis(scored_edges, order, axis=-1)
+
+
+def _row_values(matrix, columns):
+    return np.take_along_axis(matrix, columns[..., None], axis=-1)[..., 0]
+
+
+def _dense_best_matches(cost_matrix, variance_matrix):
+    # Find best and second-best matches
+    candidates = np.argpartition(cost_matrix, 2, axis=-1)
+    first, second = candidates[..., 0], candidates[..., 1]
+    swap = _row_values(cost_matrix, first) > _row_values(cost_matrix, second)
+    best_match = np.where(swap, second, first)
+    runner_up = np.where(swap, first, second)
+
+    return (
+        best_match,
+        _row_values(cost_matrix, best_match),
+        _row_values(cost_matrix, runner_up),
+        _row_values(variance_matrix, best_match),
+        np.argmin(cost_matrix, axis=-2), # incoming-best (mutual match detection)
+    )
+
+
 def score_edges(horizontal_data, vertical_data):
     horizontal_cost, horizontal_variance = horizontal_data
     vertical_cost, vertical_variance = vertical_data
 
-    num_pieces = horizontal_cost.shape[0]
-    scored_edges = []
-
     # Adaptive variance scale
     all_variances = np.concatenate(
         [
@@ -52,57 +457,113 @@ def score_edges(horizontal_data, vertical_data):
     )
     variance_scale = np.median(all_variances) if len(all_variances) > 0 else 8.0
 
-    VAR_WEIGHT = 0.5 # strength of variance penalty
-
-    # Incoming-best (mutual match detection)
-    best_horizontal_incoming = np.argmin(horizontal_cost, axis=0)
-    best_vertical_incoming = np.argmin(vertical_cost, axis=0)
-
-    for piece_idx in range(num_pieces):
-        for cost_matrix, variance_matrix, orientation, best_incoming in (
-            (horizontal_cost, horizontal_variance, HORIZONTAL, best_horizontal_incoming),
-            (vertical_cost, vertical_variance, VERTICAL, best_vertical_incoming),
-        ):
-            cost_row = cost_matrix[piece_idx]
-
-            # Find best and second-best matches
-            first, second = np.argpartition(cost_row, 2)[:2]
-            best_match, runner_up = (
-                (first, second)
-                if cost_row[first] <= cost_row[second]
-                else (second, first)
-            )
-
-            best_cost = cost_row[best_match]
-            second_cost = cost_row[runner_up]
+    return _score_best_matches(
+        _dense_best_matches(horizontal_cost, horizontal_variance),
+        _dense_best_matches(vertical_cost, vertical_variance),
+        variance_scale,
+    )
 
-            score = best_cost / second_cost
 
-            # Mutual-best bonus
-            if best_incoming[best_match] == piece_idx:
-                score -= 0.5
+def score_edges_batch(horizontal_data, vertical_data):
+    """
+    score_edges for seam_costs_from_features_batch output, one sorted
+    row of scored edges per puzzle, (B, 2 * N). Variances come from
+    finite std values, so every puzzle's median uses all of them.
+    """
+    horizontal_cost, horizontal_variance = horizontal_data
+    vertical_cost, vertical_variance = vertical_data
 
-            # Smooth variance-based penalty
-            var = variance_matrix[piece_idx, best_match]
-            score += VAR_WEIGHT * np.exp(-var / variance_scale)
+    batch = len(horizontal_cost)
+    variance_scale = np.median(
+        np.concatenate(
+            [horizontal_variance.reshape(batch, -1), vertical_variance.reshape(batch, -1)],
+            axis=1,
+        ),
+        axis=1,
+    )
 
-            scored_edges.append((score, piece_idx, best_match, orientation))
+    return _score_best_matches(
+        _dense_best_matches(horizontal_cost, horizontal_variance),
+        _dense_best_matches(vertical_cost, vertical_variance),
+        variance_scale[:, None],
+    )
 
-    scored_edges.sort(key=lambda x: x[0])
-    return scored_edges
 
+def score_candidates(horizontal_candidates, vertical_candidates, variance_scale):
+    """
+    score_edges on the sparse candidate index (requires k >= 2).
+    Only the best two candidates are read; larger k only costs memory.
+    """
+    def best_matches(candidates):
+        indices, costs, variances, best_incoming = candidates
+        return indices[:, 0], costs[:, 0], costs[:, 1], variances[:, 0], best_incoming
 
-class Cluster:
-    __slots__ = ("grid_positions", "piece_positions")
+    return _score_best_matches(
+        best_matches(horizontal_candidates),
+        best_matches(vertical_candidates),
+        variance_scale,
+    )
 
-    def __init__(self, piece_index):
-        self.grid_positions = {(0, 0): piece_index}
-        self.piece_positions = {piece_index: (0, 0)}
 
-    def try_merge(self, other, src_idx, dst_idx, orientation, grid_size):
-        src_row, src_col = self.piece_positions[src_idx]
-        dst_row, dst_col = other.piece_positions[dst_idx]
+class ClusterEngine:
+    """
+    Union-find over pieces. Every piece stores its (row, col) offset
+    relative to its parent, so a root's frame is shared by the whole
+    cluster. Roots keep an occupancy map and a bounding box that are
+    updated incrementally; merges attach the smaller cluster to the
+    larger one and only touch the smaller cluster's cells.
+    """
+
+    __slots__ = ("grid_size", "parent", "row", "col", "size", "cells", "bounds")
+
+    def __init__(self, num_pieces, grid_size):
+        self.grid_size = grid_size
+        self.parent = list(range(num_pieces))
+        self.row = [0] * num_pieces
+        self.col = [0] * num_pieces
+        self.size = [1] * num_pieces
+        self.cells = [{(0, 0): i} for i in range(num_pieces)]
+        self.bounds = [(0, 0, 0, 0) for _ in range(num_pieces)] # min/max row, min/max col
+
+    def find(self, piece_idx):
+        """
+        Return (root, row, col) of a piece in its root's frame,
+        compressing the path on the way.
+        """
+        path = []
+        node = piece_idx
+        while self.parent[node] != node:
+            path.append(node)
+            node = self.parent[node]
+        root = node
+
+        # Walk back down from the root accumulating offsets
+        row = col = 0
+        for node in reversed(path):
+            row += self.row[node]
+            col += self.col[node]
+            self.row[node] = row
+            self.col[node] = col
+            self.parent[node] = root
+
+        if path:
+            return root, self.row[piece_idx], self.col[piece_idx]
+        return root, 0, 0
+
+    def try_merge(self, src_idx, dst_idx, orientation):
+        """
+        Place dst's cluster next to src (right of it for HORIZONTAL,
+        below it for VERTICAL). Returns False without changing anything
+        if both are already joined, cells collide or the merged cluster
+        would not fit in the grid.
+        """
+        root_a, src_row, src_col = self.find(src_idx)
+        root_b, dst_row, dst_col = self.find(dst_idx)
+
+        if root_a == root_b:
+            return False
 
+        # Offset mapping cluster b's frame into cluster a's frame
         if orientation == HORIZONTAL:
             row_offset = src_row - dst_row
             col_offset = src_col + 1 - dst_col
@@ -110,82 +571,97 @@ class Cluster:
             row_offset = src_row + 1 - dst_row
             col_offset = src_col - dst_col
 
-        merged_positions = dict(self.grid_positions)
-        merged_piece_positions = dict(self.piece_positions)
-
-        for (row, col), piece_idx in other.grid_positions.items():
-            new_row = row + row_offset
-            new_col = col + col_offset
-
-            if (new_row, new_col) in merged_positions:
-                return False
-
-            merged_positions[(new_row, new_col)] = piece_idx
-            merged_piece_positions[piece_idx] = (new_row, new_col)
+        a_min_row, a_max_row, a_min_col, a_max_col = self.bounds[root_a]
+        b_min_row, b_max_row, b_min_col, b_max_col = self.bounds[root_b]
 
-        rows = [r for r, _ in merged_positions]
-        cols = [c for _, c in merged_positions]
+        min_row = min(a_min_row, b_min_row + row_offset)
+        max_row = max(a_max_row, b_max_row + row_offset)
+        min_col = min(a_min_col, b_min_col + col_offset)
+        max_col = max(a_max_col, b_max_col + col_offset)
 
-        if max(rows) - min(rows) >= grid_size:
+        if max_row - min_row >= self.grid_size:
             return False
-        if max(cols) - min(cols) >= grid_size:
+        if max_col - min_col >= self.grid_size:
             return False
 
-        self.grid_positions = merged_positions
-        self.piece_positions = merged_piece_positions
-        return True
-
-
-def start_reconstruction_v2(color_pieces, grid_size):
-    num_pieces = len(color_pieces)
-
-    lab_pieces = [
-        cv2.cvtColor(p, cv2.COLOR_BGR2LAB).astype(np.float32) for p in color_pieces
-    ]
-
-    horizontal_data, vertical_data = compute_seam_costs(lab_pieces)
-    scored_edges = score_edges(horizontal_data, vertical_data)
-
-    clusters = [Cluster(i) for i in range(num_pieces)]
-    piece_owner = {i: clusters[i] for i in range(num_pieces)}
-
-    for _, src_idx, dst_idx, orientation in scored_edges:
-        cluster_a = piece_owner[src_idx]
-        cluster_b = piece_owner[dst_idx]
+        # Probe the smaller cluster's cells against the larger one
+        if self.size[root_a] >= self.size[root_b]:
+            big, small = root_a, root_b
+            shift_row, shift_col = row_offset, col_offset
+            bounds = (min_row, max_row, min_col, max_col)
+        else:
+            big, small = root_b, root_a
+            shift_row, shift_col = -row_offset, -col_offset
+            bounds = (
+                min_row - row_offset, max_row - row_offset,
+                min_col - col_offset, max_col - col_offset,
+            )
 
-        if cluster_a is cluster_b:
-            continue
+        big_cells = self.cells[big]
+        small_cells = self.cells[small]
 
-        if cluster_a.try_merge(cluster_b, src_idx, dst_idx, orientation, grid_size):
-            for idx in list(cluster_b.piece_positions.keys()):
-                piece_owner[idx] = cluster_a
+        for row, col in small_cells:
+            if (row + shift_row, col + shift_col) in big_cells:
+                return False
 
-            cluster_b.grid_positions.clear()
-            cluster_b.piece_positions.clear()
+        for (row, col), piece_idx in small_cells.items():
+            big_cells[(row + shift_row, col + shift_col)] = piece_idx
 
-    root_clusters = {
-        piece_owner[i] for i in piece_owner if piece_owner[i].grid_positions
-    }
-    largest_cluster = max(root_clusters, key=lambda c: len(c.grid_positions))
+        self.parent[small] = big
+        self.row[small] = shift_row
+        self.col[small] = shift_col
+        self.size[big] += self.size[small]
+        self.bounds[big] = bounds
+        self.cells[small] = None
 
-    rows = [r for (r, _) in largest_cluster.grid_positions]
-    cols = [c for (_, c) in largest_cluster.grid_positions]
-    min_row, min_col = min(rows), min(cols)
+        return True
 
-    normalized_positions = {}
-    for (row, col), idx in largest_cluster.grid_positions.items():
-        new_row = row - min_row
-        new_col = col - min_col
+    def roots(self):
+        return [i for i, p in enumerate(self.parent) if i == p]
+
+    def layout(self, root):
+        """
+        Cells of a cluster shifted so its bounding box starts at (0, 0).
+        """
+        min_row, _, min_col, _ = self.bounds[root]
+        return {
+            (row - min_row, col - min_col): piece_idx
+            for (row, col), piece_idx in self.cells[root].items()
+        }
+
+
+def merge_clusters(scored_edges, num_pieces, grid_size):
+    """
+    Greedy cluster merging over scored_edges (best first), then the
+    largest cluster is laid out and leftover pieces fill its free cells.
+    Returns the (grid_size, grid_size) placement.
+    """
+    with timed("v2.cluster_merging"):
+        engine = ClusterEngine(num_pieces, grid_size)
+        merged = 0
+
+        for src_idx, dst_idx, orientation in zip(
+            scored_edges["src"].tolist(),
+            scored_edges["dst"].tolist(),
+            scored_edges["orientation"].tolist(),
+        ):
+            merged += engine.try_merge(src_idx, dst_idx, orientation)
 
-        normalized_positions[(new_row, new_col)] = idx
+    count("v2.merge_attempts", len(scored_edges))
+    count("v2.merges_accepted", merged)
+    count("v2.merges_rejected", len(scored_edges) - merged)
 
-    largest_cluster.grid_positions = normalized_positions
+    # Largest cluster; ties go to the root with the lowest piece index
+    largest_root = max(engine.roots(), key=lambda root: engine.size[root])
+    grid_positions = engine.layout(largest_root)
 
-    used_indices = set(largest_cluster.grid_positions.values())
+    used_indices = set(grid_positions.values())
     remaining_indices = [i for i in range(num_pieces) if i not in used_indices]
 
+    count("v2.fallback_placements", len(remaining_indices))
+
     if remaining_indices:
-        occupied_slots = set(largest_cluster.grid_positions)
+        occupied_slots = set(grid_positions)
         free_slots = [
             (r, c)
             for r in range(grid_size)
@@ -194,15 +670,134 @@ def start_reconstruction_v2(color_pieces, grid_size):
         ]
 
         for idx, slot in zip(remaining_indices, free_slots):
-            largest_cluster.grid_positions[slot] = idx
+            grid_positions[slot] = idx
+
+    placement = np.full((grid_size, grid_size), -1, np.intp)
+    for (row, col), idx in grid_positions.items():
+        placement[row, col] = idx
+
+    return placement
+
+
+def solve_v2(color_pieces, grid_size, sparse_k=None, cache=None, feature_dtype="float32",
+             refine_budget=None):
+    """
+    Cluster-merging v2 solve. Returns the placement: a
+    (grid_size, grid_size) array of piece indices.
+
+    Pass sparse_k (>= 2, e.g. SPARSE_K) to score from the top-k
+    candidate index instead of the dense N x N matrices; scoring uses
+    the best two candidates, so k > 2 gives the same result. With
+    cache (a FeatureCache) edge features are reused across runs on the
+    same pieces. feature_dtype (one of EDGE_DTYPES) sets how LAB edge
+    lines are stored; all choices give the same costs.
+
+    refine_budget (seconds) runs refine_placement on the seam costs
+    after cluster merging, which also fixes leftover pieces that were
+    dropped into free slots (needs the dense costs, also in sparse mode).
+    """
+    if np.dtype(feature_dtype).name not in EDGE_DTYPES:
+        raise ValueError(f"Unknown feature dtype {feature_dtype!r}, expected one of {EDGE_DTYPES}")
+    if sparse_k is not None and sparse_k < 2:
+        raise ValueError(f"sparse_k must be at least 2, got {sparse_k}")
+
+    num_pieces = len(color_pieces)
+
+    with timed("v2.edge_features"):
+        features = cached_features(
+            cache, color_pieces, edge_feature_params(feature_dtype),
+            lambda pieces: extract_edge_features(pieces, feature_dtype),
+            border=edge_feature_params()["lines"],
+        )
+
+    if sparse_k is None:
+        with timed("v2.seam_cost"):
+            horizontal_data, vertical_data = seam_costs_from_features(features)
+        with timed("v2.scoring"):
+            scored_edges = score_edges(horizontal_data, vertical_data)
+    else:
+        with timed("v2.seam_cost"):
+            horizontal_candidates, vertical_candidates, variance_scale = (
+                seam_candidates_from_features(features, k=sparse_k)
+            )
+        with timed("v2.scoring"):
+            scored_edges = score_candidates(
+                horizontal_candidates, vertical_candidates, variance_scale
+            )
+
+    placement = merge_clusters(scored_edges, num_pieces, grid_size)
+
+    if refine_budget is not None:
+        if sparse_k is not None:
+            with timed("v2.seam_cost"):
+                horizontal_data, vertical_data = seam_costs_from_features(features)
+
+        placement = refine_placement(
+            placement, horizontal_data[0], vertical_data[0], time_budget=refine_budget
+        )
+
+    return placement
+
+
+def solve_v2_batch(pieces_batch, grid_size, feature_dtype="float32"):
+    """
+    solve_v2 for many same-size puzzles at once, for high volumes of
+    small puzzles where per-call NumPy overhead outweighs the math.
+
+    pieces_batch is a (B, N, H, W, 3) array (or a sequence of B piece
+    lists); pieces need not be square. Edge features and seam costs of
+    all puzzles are computed in a few batched operations, as is edge
+    scoring; only cluster merging runs per puzzle. Returns
+    (B, grid_size, grid_size) placements, the same as calling solve_v2
+    (dense mode) on every puzzle.
+    """
+    if np.dtype(feature_dtype).name not in EDGE_DTYPES:
+        raise ValueError(f"Unknown feature dtype {feature_dtype!r}, expected one of {EDGE_DTYPES}")
+
+    pieces_batch = np.asarray(pieces_batch)
+    if pieces_batch.ndim != 5:
+        raise ValueError(f"Expected a (B, N, H, W, 3) stack, got shape {pieces_batch.shape}")
+
+    batch, num_pieces = pieces_batch.shape[:2]
+    if num_pieces != grid_size * grid_size:
+        raise ValueError(f"Expected {grid_size * grid_size} pieces, got {num_pieces}")
+
+    with timed("v2.edge_features"):
+        features = extract_edge_features_batch(pieces_batch, feature_dtype)
+
+    with timed("v2.seam_cost"):
+        horizontal_data, vertical_data = seam_costs_from_features_batch(features)
+
+    with timed("v2.scoring"):
+        scored_edges = score_edges_batch(horizontal_data, vertical_data)
+
+    return np.stack([
+        merge_clusters(puzzle_edges, num_pieces, grid_size) for puzzle_edges in scored_edges
+    ])
+
+
+def start_reconstruction_v2(color_pieces, grid_size, sparse_k=None, out=None):
+    """
+    solve_v2 followed by assembly (into out when given).
+    """
+    return assemble_pieces(color_pieces, solve_v2(color_pieces, grid_size, sparse_k), out)
+
+
+def start_reconstruction_v2_batch(pieces_batch, grid_size, out=None):
+    """
+    solve_v2_batch followed by assembly of every puzzle.
+    Returns a (B, H, W, 3) stack of canvases (written into out when given).
+    """
+    pieces_batch = np.asarray(pieces_batch)
+    placements = solve_v2_batch(pieces_batch, grid_size)
 
-    piece_height, piece_width = color_pieces[0].shape[:2]
-    canvas = np.zeros((grid_size * piece_height, grid_size * piece_width, 3), np.uint8)
+    if out is None:
+        out = np.empty(
+            (len(pieces_batch),) + canvas_shape(pieces_batch[0], placements[0]),
+            pieces_batch.dtype,
+        )
 
-    for (row, col), idx in largest_cluster.grid_positions.items():
-        canvas[
-            row * piece_height : (row + 1) * piece_height,
-            col * piece_width : (col + 1) * piece_width,
-        ] = color_pieces[idx]
+    for pieces, placement, canvas in zip(pieces_batch, placements, out):
+        assemble_pieces(pieces, placement, canvas)
 
-    return canvas
+    return out
@@ -0,0 +1,244 @@
+import time
+
+import numpy as np
+
+from src.instrumentation import count, timed
+
+# Cost used for non-finite entries (e.g. the inf diagonal of v2 costs)
+MAX_SEAM_COST = 1e9
+
+# Moves must lower the total cost by more than this to be applied
+MIN_IMPROVEMENT = 1e-9
+
+
+def placement_cost(placement, horizontal, vertical):
+    """
+    Total seam cost of a placement: horizontal[a, b] for every piece a
+    left of b, plus vertical[a, b] for every a above b.
+    """
+    placement = np.asarray(placement)
+    return float(
+        horizontal[placement[:, :-1], placement[:, 1:]].sum()
+        + vertical[placement[:-1], placement[1:]].sum()
+    )
+
+
+def normalize_seam_costs(cost):
+    """
+    Divide every row by its second-smallest entry, the best-vs-runner-up
+    ratio v2 also scores by: raw seam costs vary a lot between pieces,
+    ratios compare across pieces.
+    """
+    cost = np.nan_to_num(
+        np.asarray(cost, dtype=np.float64),
+        nan=MAX_SEAM_COST, posinf=MAX_SEAM_COST, neginf=MAX_SEAM_COST,
+    )
+    if cost.shape[1] < 2:
+        return cost
+
+    second = np.partition(cost, 1, axis=1)[:, 1]
+    return cost / np.maximum(second, MIN_IMPROVEMENT)[:, None]
+
+
+class _Budget:
+    """
+    Wall-clock and move-evaluation limit, checked once per proposal.
+    """
+
+    def __init__(self, time_budget, max_iterations):
+        self.deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.max_iterations = max_iterations
+        self.iterations = 0
+
+    def spend(self):
+        self.iterations += 1
+        if self.max_iterations is not None and self.iterations > self.max_iterations:
+            return False
+        return self.deadline is None or time.perf_counter() < self.deadline
+
+
+# PIECE SWAPS
+def _cell_seams(grid, horizontal, vertical, row, col, piece, skip):
+    """
+    Seam cost of piece placed at (row, col) against its current
+    neighbors, ignoring the neighbor cell skip.
+    """
+    rows, cols = len(grid), len(grid[0])
+    cost = 0.0
+
+    if col > 0 and (row, col - 1) != skip:
+        cost += horizontal[grid[row][col - 1]][piece]
+    if col + 1 < cols and (row, col + 1) != skip:
+        cost += horizontal[piece][grid[row][col + 1]]
+    if row > 0 and (row - 1, col) != skip:
+        cost += vertical[grid[row - 1][col]][piece]
+    if row + 1 < rows and (row + 1, col) != skip:
+        cost += vertical[piece][grid[row + 1][col]]
+
+    return cost
+
+
+def _swap_delta(grid, horizontal, vertical, a, b):
+    """
+    Cost change of swapping the pieces at cells a and b, from at most
+    8 seams (O(1) regardless of the grid size).
+    """
+    (ra, ca), (rb, cb) = a, b
+    pa, pb = grid[ra][ca], grid[rb][cb]
+
+    before = (
+        _cell_seams(grid, horizontal, vertical, ra, ca, pa, b)
+        + _cell_seams(grid, horizontal, vertical, rb, cb, pb, a)
+    )
+    after = (
+        _cell_seams(grid, horizontal, vertical, ra, ca, pb, b)
+        + _cell_seams(grid, horizontal, vertical, rb, cb, pa, a)
+    )
+
+    # Seam between a and b when they are adjacent
+    if ra == rb and abs(ca - cb) == 1:
+        left, right = (pa, pb) if ca < cb else (pb, pa)
+        before += horizontal[left][right]
+        after += horizontal[right][left]
+    elif ca == cb and abs(ra - rb) == 1:
+        top, bottom = (pa, pb) if ra < rb else (pb, pa)
+        before += vertical[top][bottom]
+        after += vertical[bottom][top]
+
+    return after - before
+
+
+def _swap_pass(grid, horizontal, vertical, budget):
+    """
+    Try every pair of cells once, applying improving swaps immediately.
+    Returns (moves applied, whether the budget ran out).
+    """
+    cells = [(r, c) for r in range(len(grid)) for c in range(len(grid[0]))]
+    moves = 0
+
+    for i, a in enumerate(cells):
+        for b in cells[i + 1:]:
+            if not budget.spend():
+                return moves, True
+
+            if _swap_delta(grid, horizontal, vertical, a, b) < -MIN_IMPROVEMENT:
+                (ra, ca), (rb, cb) = a, b
+                grid[ra][ca], grid[rb][cb] = grid[rb][cb], grid[ra][ca]
+                moves += 1
+
+    return moves, False
+
+
+# ROW / COLUMN BLOCK MOVES
+def _line_pair_costs(grid, horizontal, vertical, axis):
+    """
+    pair[a, b]: summed seam cost of putting row (axis 0) or column
+    (axis 1) a directly before b.
+    """
+    if axis == 0:
+        return vertical[grid[:, None, :], grid[None, :, :]].sum(axis=2)
+    return horizontal[grid.T[:, None, :], grid.T[None, :, :]].sum(axis=2)
+
+
+def _block_move_delta(pair, n, start, stop, target):
+    """
+    Cost change of moving lines [start, stop) to just before line target
+    (target == n: to the end). Only the 3 boundaries that change are
+    evaluated, so this is O(1).
+    """
+    def seam(a, b):
+        return pair[a][b] if a >= 0 and b < n else 0.0
+
+    removed = seam(start - 1, start) + seam(stop - 1, stop) + seam(target - 1, target)
+    added = seam(start - 1, stop) + seam(target - 1, start) + seam(stop - 1, target)
+    return added - removed
+
+
+def _block_move_order(n, start, stop, target):
+    lines = list(range(n))
+    block = lines[start:stop]
+    rest = lines[:start] + lines[stop:]
+    insert_at = target if target < start else target - (stop - start)
+    return rest[:insert_at] + block + rest[insert_at:]
+
+
+def _block_pass(grid, horizontal, vertical, axis, budget):
+    """
+    Try moving every contiguous block of rows / columns to every other
+    position, applying improving moves immediately.
+    Returns (grid, moves applied, whether the budget ran out).
+    """
+    n = grid.shape[axis]
+    pair = _line_pair_costs(grid, horizontal, vertical, axis).tolist()
+    moves = 0
+
+    for length in range(1, n):
+        for start in range(n - length + 1):
+            stop = start + length
+
+            for target in range(n + 1):
+                if start <= target <= stop:
+                    continue
+                if not budget.spend():
+                    return grid, moves, True
+
+                if _block_move_delta(pair, n, start, stop, target) < -MIN_IMPROVEMENT:
+                    order = _block_move_order(n, start, stop, target)
+                    grid = grid[order] if axis == 0 else grid[:, order]
+                    pair = _line_pair_costs(grid, horizontal, vertical, axis).tolist()
+                    moves += 1
+
+    return grid, moves, False
+
+
+def refine_placement(placement, horizontal, vertical, time_budget=None, max_iterations=None,
+                     normalize=True):
+    """
+    Anytime local search lowering placement_cost. Alternates passes of
+    piece swaps and row / column block moves, each judged by an O(1)
+    incremental cost delta, until a pass finds no improving move or the
+    budget (seconds of wall-clock time and / or number of evaluated
+    moves) runs out. The best placement so far is always returned.
+
+    horizontal / vertical are the solver's (N, N) pairwise seam costs,
+    lower is better. With normalize (default) the search minimizes
+    normalize_seam_costs of them; minimizing raw costs tends to trade
+    correct seams for many slightly cheaper wrong ones.
+    Returns a new placement array.
+    """
+    if normalize:
+        horizontal = normalize_seam_costs(horizontal)
+        vertical = normalize_seam_costs(vertical)
+
+    costs = np.nan_to_num(
+        np.stack([horizontal, vertical]).astype(np.float64),
+        nan=MAX_SEAM_COST, posinf=MAX_SEAM_COST, neginf=MAX_SEAM_COST,
+    )
+    grid = np.array(placement, dtype=np.intp)
+
+    if grid.size < 2:
+        return grid
+
+    budget = _Budget(time_budget, max_iterations)
+    horizontal_rows, vertical_rows = costs.tolist()
+
+    with timed("refinement"):
+        while True:
+            cells = grid.tolist()
+            moves, exhausted = _swap_pass(cells, horizontal_rows, vertical_rows, budget)
+            grid = np.array(cells, dtype=np.intp)
+
+            for axis in (0, 1):
+                if exhausted:
+                    break
+                grid, block_moves, exhausted = _block_pass(
+                    grid, costs[0], costs[1], axis, budget
+                )
+                moves += block_moves
+
+            count("refinement.moves", moves)
+            if exhausted or moves == 0:
+                break
+
+    count("refinement.evaluated", budget.iterations)
+    return grid
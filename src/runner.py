@@ -0,0 +1,26 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def run_tasks(func, tasks, workers=None, chunksize=None):
+    """
+    Call func(*task) for every task tuple and return the results in
+    task order, regardless of which worker finished first.
+
+    workers=None uses every core, workers=1 runs in-process (handy for
+    debugging). func must be a module-level function so it can be
+    pickled. Tasks are submitted in chunks to amortize IPC overhead.
+    """
+    tasks = list(tasks)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        return [func(*task) for task in tasks]
+
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*tasks), chunksize=chunksize))
@@ -1,49 +1,125 @@
 import cv2
+import numpy as np
 
-def segment_and_extract(original_img, grid_size, img_name):
+
+def compute_grid_geometry(shape, grid_size):
     """
-    Takes the image and splits it into grid_size x grid_size tiles.
-    Returns (contour_img, cropped_pieces, piece_metadata)
+    Tile coordinates for a grid_size x grid_size split of an image of
+    the given shape. Returns the piece_metadata list.
     """
-
-    h, w = original_img.shape[:2]
+    h, w = shape[:2]
 
     # Calculate size of each tile
     tile_h = h // grid_size
     tile_w = w // grid_size
 
-    contour_img = original_img.copy()
-    cropped_pieces = []
     piece_metadata = []
-
     piece_id = 1
 
     for r in range(grid_size):
         for c in range(grid_size):
-            # Coordinates of the tile
-            y1 = r * tile_h
-            y2 = (r + 1) * tile_h
-            x1 = c * tile_w
-            x2 = (c + 1) * tile_w
-
-            # Crop tile
-            tile = original_img[y1:y2, x1:x2]
-
-            # Add to output lists
-            cropped_pieces.append(tile)
             piece_metadata.append({
                 "id": piece_id,
                 "row": r,
                 "col": c,
-                "x1": x1,
-                "y1": y1,
-                "x2": x2,
-                "y2": y2
+                "x1": c * tile_w,
+                "y1": r * tile_h,
+                "x2": (c + 1) * tile_w,
+                "y2": (r + 1) * tile_h
             })
+            piece_id += 1
 
-            # Draw bounding box on contour image
-            cv2.rectangle(contour_img, (x1, y1), (x2, y2), (0, 0, 255), 2)
+    return piece_metadata
+
+
+def extract_tiles(img, piece_metadata):
+    """
+    Tiles of img as views (no pixel copies).
+    """
+    return [img[m["y1"]:m["y2"], m["x1"]:m["x2"]] for m in piece_metadata]
+
+
+def draw_grid_contours(img, piece_metadata):
+    """
+    Copy of img with every tile's bounding box drawn on it.
+    """
+    contour_img = img.copy()
+
+    for m in piece_metadata:
+        cv2.rectangle(contour_img, (m["x1"], m["y1"]), (m["x2"], m["y2"]), (0, 0, 255), 2)
+
+    return contour_img
+
+
+def segment_images(images, grid_size):
+    """
+    Split any number of aligned images (same height and width) with a
+    single grid computation.
+    Returns (piece_metadata, [tiles of images[0], tiles of images[1], ...]).
+    """
+    shape = images[0].shape[:2]
+    for img in images[1:]:
+        if img.shape[:2] != shape:
+            raise ValueError(f"Images are not aligned: {img.shape[:2]} != {shape}")
+
+    piece_metadata = compute_grid_geometry(shape, grid_size)
+    return piece_metadata, [extract_tiles(img, piece_metadata) for img in images]
 
-            piece_id += 1
 
-    return contour_img, cropped_pieces, piece_metadata
\ No newline at end of file
+def segment_and_extract(original_img, grid_size, img_name):
+    """
+    Takes the image and splits it into grid_size x grid_size tiles.
+    Returns (contour_img, cropped_pieces, piece_metadata)
+    """
+    piece_metadata, (cropped_pieces,) = segment_images([original_img], grid_size)
+    contour_img = draw_grid_contours(original_img, piece_metadata)
+
+    return contour_img, cropped_pieces, piece_metadata
+
+
+def _grid_layout(piece_metadata):
+    last = piece_metadata[-1]
+    tile_h = last["y2"] - last["y1"]
+    tile_w = last["x2"] - last["x1"]
+    return last["row"] + 1, last["col"] + 1, tile_h, tile_w
+
+
+def tile_stack(img, piece_metadata):
+    """
+    All tiles of a 2-D image as one (rows, cols, tile_h, tile_w) view.
+    """
+    rows, cols, tile_h, tile_w = _grid_layout(piece_metadata)
+    grid = img[:rows * tile_h, :cols * tile_w]
+    return grid.reshape(rows, tile_h, cols, tile_w).swapaxes(1, 2)
+
+
+def padded_mosaic(tiles, pad):
+    """
+    Lay a (rows, cols, tile_h, tile_w) tile stack out as one 2-D image
+    where every tile is surrounded by `pad` pixels replicated from its
+    own border. Filters with a radius <= pad then see each tile exactly
+    as they would with BORDER_REPLICATE on the tile alone.
+    """
+    rows, cols, tile_h, tile_w = tiles.shape
+    padded = np.pad(tiles, ((0, 0), (0, 0), (pad, pad), (pad, pad)), mode="edge")
+    return np.ascontiguousarray(
+        padded.swapaxes(1, 2).reshape(rows * (tile_h + 2 * pad), cols * (tile_w + 2 * pad))
+    )
+
+
+def mosaic_interiors(mosaic, piece_metadata, pad):
+    """
+    The (rows, cols, tile_h, tile_w) tile stack of a padded mosaic,
+    without the padding (a view).
+    """
+    rows, cols, tile_h, tile_w = _grid_layout(piece_metadata)
+    cells = mosaic.reshape(rows, tile_h + 2 * pad, cols, tile_w + 2 * pad).swapaxes(1, 2)
+    return cells[:, :, pad:pad + tile_h, pad:pad + tile_w]
+
+
+def stack_to_tiles(stack, piece_metadata):
+    """
+    Per-piece views of a (rows, cols, tile_h, tile_w) stack, in
+    piece_metadata order.
+    """
+    return [stack[m["row"], m["col"]] for m in piece_metadata]
@@ -10,7 +10,46 @@ def detect_grid_size(img, img_clahe):
     return grid_raw if conf_raw >= conf_clahe else grid_clahe
 
 
-def compute_grid(img):
+DETECTION_MAX_SIDE = 512 # longest side used by the fast detector
+DECISIVE_CONFIDENCE = 2.0 # every expected grid line found on both axes
+
+
+def _downscale(img, max_side):
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1.0:
+        return img
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def detect_grid_size_fast(img, img_clahe, max_side=DETECTION_MAX_SIDE,
+                          decisive=DECISIVE_CONFIDENCE):
+    """
+    detect_grid_size on images downscaled to at most max_side pixels,
+    which exits after the first image when its confidence reaches
+    decisive. img_clahe is only examined when the evidence from img is
+    ambiguous; it may be a zero-argument callable so the CLAHE image is
+    not even computed in the decisive case.
+    """
+    grid_raw, conf_raw = compute_grid(_downscale(img, max_side))
+    if conf_raw >= decisive:
+        return grid_raw
+
+    if callable(img_clahe):
+        img_clahe = img_clahe()
+
+    grid_clahe, conf_clahe = compute_grid(_downscale(img_clahe, max_side))
+
+    # choose whichever produced stronger grid evidence
+    return grid_raw if conf_raw >= conf_clahe else grid_clahe
+
+
+def _edge_projections(img):
+    """
+    Column (vertical lines) and row (horizontal lines) edge-strength
+    profiles, smoothed and normalized by their median.
+    """
     h, w = img.shape
 
     # Enhanced grayscale using local variance
@@ -38,6 +77,12 @@ def compute_grid(img):
     v_norm = vx / (np.median(vx) + 1e-5)
     h_norm = hy / (np.median(hy) + 1e-5)
 
+    return v_norm, h_norm
+
+
+def compute_grid(img):
+    v_norm, h_norm = _edge_projections(img)
+
     # Grid scoring helper
     def grid_score(proj, N):
         if N == 8:
@@ -76,3 +121,81 @@ def compute_grid(img):
     if is4: return 4, pv4 + ph4
 
     return 2, 0.0
+
+
+MAX_GRID = 16
+MIN_PERIOD_CONTRAST = 0.3 # weaker axes fall back to 2, like compute_grid
+SUBDIVISION_RATIO = 0.7 # finer multiples this close to the best contrast win
+
+
+def _comb_steps(L, n):
+    """
+    Line spacings to test for n splits of L pixels: the exact L / n and,
+    for grids cut into floor(L / n) tiles, that integer width too (its
+    lines drift up to n pixels from k * L / n). The integer width only
+    counts when the leftover strip is narrower than one tile.
+    """
+    steps = [L / n]
+
+    tile = L // n
+    if tile != L / n and L - n * tile < tile:
+        steps.append(tile)
+
+    return steps
+
+
+def grid_period_contrast(proj, max_grid=MAX_GRID):
+    """
+    Line-vs-midpoint contrast of proj for every split count n: the 25th
+    percentile of proj on the n - 1 interior lines minus its mean
+    halfway between them, the best over _comb_steps.
+
+    The image border is not a line, so it is left out (it would be half
+    of the comb for n = 2). The low percentile needs most expected lines
+    to be present, which penalizes too-fine candidates; too-coarse ones
+    whose midpoints hit real lines are penalized by the midpoint mean.
+    Returns an array indexed by n (entries below 2 are -inf).
+    """
+    L = len(proj)
+    contrast = np.full(max_grid + 1, -np.inf)
+
+    for n in range(2, min(max_grid, L // 4) + 1):
+        for step in _comb_steps(L, n):
+            lines = proj[np.rint(np.arange(1, n) * step).astype(int)]
+            midpoints = proj[np.minimum(L - 1, np.rint((np.arange(n) + 0.5) * step).astype(int))]
+            contrast[n] = max(contrast[n], np.percentile(lines, 25) - midpoints.mean())
+
+    return contrast
+
+
+def _axis_splits(proj, max_grid, min_contrast):
+    contrast = grid_period_contrast(proj, max_grid)
+    n = int(np.argmax(contrast))
+
+    if contrast[n] < min_contrast:
+        return 2, float(contrast[n])
+
+    # A divisor of the true count can score as high (its lines are real
+    # and its midpoints fall between real lines): prefer the finest
+    # multiple that scores almost as well
+    finer = [m for m in range(2 * n, max_grid + 1, n) if contrast[m] >= SUBDIVISION_RATIO * contrast[n]]
+    if finer:
+        n = max(finer)
+    return n, float(contrast[n])
+
+
+def detect_grid_shape(img, max_grid=MAX_GRID, min_contrast=MIN_PERIOD_CONTRAST):
+    """
+    Detect an arbitrary rows x cols grid by scoring a comb of evenly
+    spaced lines against the edge projections, for every split count.
+    Returns (rows, cols, confidence); confidence is the weaker axis'
+    line-vs-midpoint contrast in units of the median edge strength.
+    Axes without clear periodic evidence default to 2 splits, so a
+    2 x 2 grid with weak seams is still the most error-prone case.
+    """
+    v_norm, h_norm = _edge_projections(img)
+
+    rows, row_conf = _axis_splits(h_norm, max_grid, min_contrast)
+    cols, col_conf = _axis_splits(v_norm, max_grid, min_contrast)
+
+    return rows, cols, min(row_conf, col_conf)
@@ -1,6 +1,11 @@
 import cv2
 import numpy as np
 
+from src.segmentation import mosaic_interiors, padded_mosaic, stack_to_tiles, tile_stack
+
+BLOCK_SIZE = 25
+C_CONSTANT = 5
+
 
 def threshold_adaptive(img):
     """
@@ -19,8 +24,8 @@ def threshold_adaptive(img):
         255,
         cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
         cv2.THRESH_BINARY_INV,
-        25,  # block size
-        5    # C constant
+        BLOCK_SIZE,
+        C_CONSTANT
     )
 
     # 3. Morphological cleanup
@@ -31,6 +36,39 @@ def threshold_adaptive(img):
     return binary
 
 
+def threshold_adaptive_tiles(img, piece_metadata):
+    """
+    threshold_adaptive for every tile of img in one pass per operation.
+    Tiles are laid out in a mosaic padded with their own replicated
+    borders, so the result equals calling threshold_adaptive per tile.
+    Returns one binary view per piece, in piece_metadata order.
+    """
+    if len(img.shape) == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    pad = BLOCK_SIZE // 2
+    mosaic = padded_mosaic(tile_stack(img, piece_metadata), pad)
+
+    binary = cv2.adaptiveThreshold(
+        mosaic,
+        255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY_INV,
+        BLOCK_SIZE,
+        C_CONSTANT
+    )
+
+    # Per-tile morphology ignores pixels outside the tile; re-padding
+    # with replicated result pixels has the same effect for min/max
+    binary = padded_mosaic(mosaic_interiors(binary, piece_metadata, pad), pad)
+
+    kernel = np.ones((2,2), np.uint8)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+
+    return stack_to_tiles(mosaic_interiors(binary, piece_metadata, pad), piece_metadata)
+
+
 def threshold_otsu(img):
     """
     Global Otsu threshold for cleaner, more stable masks.
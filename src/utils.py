@@ -1,14 +1,250 @@
 import cv2
+import json
 import os
+import struct
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 
-def save_image(img, img_name, output_dir, suffix=""):
-    os.makedirs(output_dir, exist_ok=True)
+from src.instrumentation import active_stats, count, timed
+
+# Directories already created by this process
+_created_dirs = set()
+
+
+def _ensure_dir(output_dir):
+    if output_dir not in _created_dirs:
+        os.makedirs(output_dir, exist_ok=True)
+        _created_dirs.add(output_dir)
+
+
+def _write_image(save_path, img):
+    """
+    cv2.imwrite that raises IOError instead of returning False. A failed
+    write re-creates the directory (it may have been removed since it
+    was cached in _created_dirs) and is retried once.
+    """
+    if cv2.imwrite(save_path, img):
+        return save_path
+
+    output_dir = os.path.dirname(save_path)
+    _created_dirs.discard(output_dir)
+    _ensure_dir(output_dir)
+
+    if not cv2.imwrite(save_path, img):
+        raise IOError(f"Could not write {save_path}")
+    return save_path
+
+
+def _artifact_path(img_name, output_dir, suffix=""):
+    _ensure_dir(output_dir)
 
     if suffix:
         filename = f"{img_name}_{suffix}.png"
     else:
         filename = f"{img_name}.png"
 
-    save_path = os.path.join(output_dir, filename)
-    cv2.imwrite(save_path, img)
-    return save_path
\ No newline at end of file
+    return os.path.join(output_dir, filename)
+
+
+# OpenCV decode flags for grayscale at 1/1, 1/2, 1/4 and 1/8 scale
+REDUCED_GRAYSCALE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# JPEG start-of-frame markers (carry the image size)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_image_size(img_path):
+    """
+    (width, height) from a PNG or JPEG header without decoding pixels.
+    Returns None for other formats or unreadable headers.
+    """
+    with open(img_path, "rb") as f:
+        head = f.read(24)
+
+        if head[:8] == b"\x89PNG\r\n\x1a\n" and len(head) == 24:
+            return struct.unpack(">II", head[16:24])
+
+        if head[:2] != b"\xff\xd8":
+            return None
+
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+
+            # Fill bytes before a marker
+            while marker[1] == 0xFF:
+                marker = marker[:1] + f.read(1)
+
+            # Standalone markers carry no length
+            if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD8:
+                continue
+
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack(">H", length_bytes)[0]
+
+            if marker[1] in _JPEG_SOF_MARKERS:
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None
+                height, width = struct.unpack(">HH", frame[1:5])
+                return width, height
+
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def detection_reduce(img_path, min_side=512):
+    """
+    Coarsest decode scale (1, 2, 4 or 8) whose longest side is still at
+    least min_side, from the file header; 1 when the size is unknown.
+    """
+    size = read_image_size(img_path)
+
+    if size is not None:
+        longest = max(size)
+        for factor in (8, 4, 2):
+            if longest / factor >= min_side:
+                return factor
+
+    return 1
+
+
+def read_detection_image(img_path, min_side=512):
+    """
+    Grayscale decode at the detection_reduce scale, using OpenCV's
+    reduced decoding (JPEG decodes the smaller image directly).
+    Returns (gray, reduce_factor).
+    """
+    reduce = detection_reduce(img_path, min_side)
+    gray = cv2.imread(img_path, REDUCED_GRAYSCALE_FLAGS[reduce])
+    return gray, reduce
+
+
+def save_image(img, img_name, output_dir, suffix="", writer=None):
+    if writer is not None:
+        return writer.save(img, img_name, output_dir, suffix)
+
+    return _write_image(_artifact_path(img_name, output_dir, suffix), img)
+
+
+def save_packed_pieces(pieces, piece_metadata, img_name, output_dir):
+    """
+    Write all pieces of a puzzle as one (N, H, W, 3) .npy array plus a
+    .json sidecar holding the piece metadata.
+    Returns the .npy path.
+    """
+    _ensure_dir(output_dir)
+    array_path = os.path.join(output_dir, f"{img_name}.npy")
+    meta_path = os.path.join(output_dir, f"{img_name}.json")
+
+    np.save(array_path, np.stack(pieces))
+    with open(meta_path, "w") as f:
+        json.dump(piece_metadata, f)
+
+    return array_path
+
+
+def load_packed_pieces(array_path):
+    """
+    Memory-map a packed puzzle written by save_packed_pieces.
+    Returns (pieces, piece_metadata); pieces[i] is a read-only view.
+    """
+    pieces = np.load(array_path, mmap_mode="r")
+
+    meta_path = os.path.splitext(array_path)[0] + ".json"
+    piece_metadata = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            piece_metadata = json.load(f)
+
+    return pieces, piece_metadata
+
+
+def _timed_call(stats, func, *args):
+    with stats.timer("io.write"):
+        return func(*args)
+
+
+class ArtifactWriter:
+    """
+    Encodes and writes images on a background thread pool
+    (cv2.imwrite releases the GIL while encoding).
+
+    At most max_pending writes are in flight; save() blocks once that
+    many are queued, so a slow disk throttles the producer instead of
+    buffering images without bound. Images must not be modified after
+    being handed to save(). flush() waits for every queued write and
+    re-raises the first failure; close() also stops the threads.
+    """
+
+    def __init__(self, workers=4, max_pending=64):
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="artifact-writer"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def submit(self, func, *args):
+        """
+        Queue an arbitrary write, e.g. save_packed_pieces.
+        """
+        with timed("io.writer_wait"):
+            self._slots.acquire()
+
+        # Worker threads do not inherit the caller's context
+        stats = active_stats()
+        if stats is not None:
+            func = partial(_timed_call, stats, func)
+        count("io.artifacts")
+
+        future = self._pool.submit(func, *args)
+
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._release)
+
+        return future
+
+    def save(self, img, img_name, output_dir, suffix=""):
+        save_path = _artifact_path(img_name, output_dir, suffix)
+        self.submit(_write_image, save_path, img)
+        return save_path
+
+    def _release(self, future):
+        self._slots.release()
+
+    def flush(self):
+        with self._lock:
+            pending = list(self._pending)
+
+        with timed("io.flush"):
+            wait(pending)
+
+        with self._lock:
+            self._pending.difference_update(pending)
+
+        for future in pending:
+            future.result()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()